@@ -1,31 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from typing import Literal, Optional
+from datetime import datetime
 import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select
 
 from ...core.database import get_db
 from ...core.security import get_current_admin
-from ...models.user import User, Generation
-from ...schemas import UserResponse, AdminUserUpdate, AnalyticsResponse, CreditsUpdate
+from ...core.pagination import paginate, next_cursor
+from ...core.user_cache import user_cache
+from ...services.credits import set_credits, adjust_credits as adjust_user_credits
+from ...models.user import User
+from ...schemas import UserResponse, AdminUserUpdate, AnalyticsResponse, AnalyticsBucket, CreditsUpdate
+from ...services import stats
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
 
 @router.get("/users", response_model=list[UserResponse])
 async def list_users(
+    response: Response,
     limit: int = 50,
     offset: int = 0,
+    cursor: Optional[str] = None,
     admin: User = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db)
 ):
-    """List all users (admin only)"""
-    result = await db.execute(
-        select(User)
-        .order_by(User.created_at.desc())
-        .limit(limit)
-        .offset(offset)
-    )
-    return result.scalars().all()
+    """List all users (admin only); X-Next-Cursor holds the next page's cursor"""
+    result = await db.execute(paginate(select(User), User, limit, cursor, offset))
+    users = result.scalars().all()
+    
+    cursor = next_cursor(users, limit)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+    return users
 
 
 @router.get("/users/{user_id}", response_model=UserResponse)
@@ -70,10 +78,11 @@ async def update_user(
     if update_data.role is not None:
         user.role = update_data.role
     if update_data.credits is not None:
-        user.credits = update_data.credits
+        await set_credits(db, user.id, update_data.credits, reason="admin:update", commit=False)
     
     await db.commit()
     await db.refresh(user)
+    await user_cache.invalidate(user.id)
     return user
 
 
@@ -90,20 +99,15 @@ async def adjust_credits(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid UUID format")
 
-    result = await db.execute(select(User).where(User.id == user_uuid))
-    user = result.scalar_one_or_none()
-    if not user:
+    new_balance = await adjust_user_credits(
+        db, user_uuid, credits_data.amount, reason=f"admin:{credits_data.reason}"
+    )
+    if new_balance is None:
         raise HTTPException(status_code=404, detail="User not found")
     
-    user.credits += credits_data.amount
-    if user.credits < 0:
-        user.credits = 0
-    
-    await db.commit()
-    
     return {
         "user_id": user_id,
-        "new_balance": user.credits,
+        "new_balance": new_balance,
         "adjustment": credits_data.amount,
         "reason": credits_data.reason
     }
@@ -129,6 +133,7 @@ async def delete_user(
     # Soft delete - just deactivate
     user.is_active = False
     await db.commit()
+    await user_cache.invalidate(user.id)
     
     return {"message": "User deactivated", "user_id": user_id}
 
@@ -138,38 +143,18 @@ async def get_analytics(
     admin: User = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get platform analytics (admin only)"""
-    # Total users
-    users_result = await db.execute(select(func.count(User.id)))
-    total_users = users_result.scalar()
-    
-    # Active users
-    active_result = await db.execute(
-        select(func.count(User.id)).where(User.is_active == True)
-    )
-    active_users = active_result.scalar()
-    
-    # Total generations
-    gen_result = await db.execute(select(func.count(Generation.id)))
-    total_generations = gen_result.scalar()
-    
-    # Credits consumed
-    credits_result = await db.execute(
-        select(func.sum(Generation.credits_used))
-    )
-    credits_consumed = credits_result.scalar() or 0
-    
-    # Popular types
-    type_result = await db.execute(
-        select(Generation.type, func.count(Generation.id))
-        .group_by(Generation.type)
-    )
-    popular_types = {row[0]: row[1] for row in type_result}
-    
-    return AnalyticsResponse(
-        total_users=total_users,
-        active_users=active_users,
-        total_generations=total_generations,
-        credits_consumed=credits_consumed,
-        popular_types=popular_types
-    )
+    """Get platform analytics (admin only), served from rollups"""
+    return AnalyticsResponse(**await stats.get_analytics_snapshot(db))
+
+
+@router.get("/analytics/timeseries", response_model=list[AnalyticsBucket])
+async def get_analytics_timeseries(
+    granularity: Literal["hour", "day"] = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    type: Optional[str] = None,
+    admin: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Generation counts and credits per hour/day bucket (admin only)"""
+    return await stats.get_rollups(db, granularity, start, end, type)
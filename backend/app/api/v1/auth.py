@@ -11,6 +11,7 @@ from ...core.security import (
     create_access_token,
     get_current_user
 )
+from ...core.user_cache import user_cache
 from ...core.config import settings
 from ...models.user import User
 from ...schemas import UserCreate, UserResponse, Token
@@ -74,6 +75,7 @@ async def login(
     # Update last login
     user.last_login = datetime.utcnow()
     await db.commit()
+    await user_cache.invalidate(user.id)
     
     # Create token
     access_token = create_access_token(data={"sub": str(user.id)})
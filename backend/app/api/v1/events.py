@@ -0,0 +1,100 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import Optional
+import json
+import uuid
+
+from ...core.database import get_db
+from ...core.security import get_current_user_for_stream
+from ...models.user import User, Generation
+from ...services import events
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+
+def _sse(event: dict) -> str:
+    return f"event: generation\ndata: {json.dumps(event)}\n\n"
+
+
+def _event_stream(subscription: events.Subscription, generation_id: Optional[str] = None, initial: Optional[dict] = None):
+    """Relay pub/sub events as SSE; a single-generation stream ends at its final status"""
+    async def stream():
+        try:
+            if initial:
+                yield _sse(initial)
+                if initial["status"] in events.TERMINAL_STATUSES:
+                    return
+            
+            while True:
+                event = await subscription.next()
+                if event is None:
+                    # Keep proxies from closing an idle stream
+                    yield ": ping\n\n"
+                    continue
+                if generation_id and event["generation_id"] != generation_id:
+                    continue
+                
+                yield _sse(event)
+                if generation_id and event["status"] in events.TERMINAL_STATUSES:
+                    return
+        finally:
+            await subscription.close()
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _subscribe(user: User) -> events.Subscription:
+    try:
+        return await events.subscribe(user.id)
+    except Exception:
+        raise HTTPException(status_code=503, detail="Event stream unavailable")
+
+
+@router.get("/generations")
+async def stream_all_generations(
+    current_user: User = Depends(get_current_user_for_stream)
+):
+    """
+    Server-Sent Events for all of the user's generations.
+    Browsers can pass the access token as ?token= (EventSource cannot set headers).
+    """
+    subscription = await _subscribe(current_user)
+    return _event_stream(subscription)
+
+
+@router.get("/generations/{generation_id}")
+async def stream_generation(
+    generation_id: str,
+    current_user: User = Depends(get_current_user_for_stream),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Server-Sent Events for one generation: its current state first, then
+    status transitions and stage progress until it completes or fails.
+    """
+    try:
+        gen_uuid = uuid.UUID(generation_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid UUID format")
+    
+    # Subscribe before reading the row so a transition in between is not lost
+    subscription = await _subscribe(current_user)
+    
+    result = await db.execute(
+        select(Generation)
+        .where(Generation.id == gen_uuid)
+        .where(Generation.user_id == current_user.id)
+    )
+    gen = result.scalar_one_or_none()
+    
+    if not gen:
+        await subscription.close()
+        raise HTTPException(status_code=404, detail="Generation not found")
+    
+    return _event_stream(subscription, str(gen.id), events.generation_event(gen))
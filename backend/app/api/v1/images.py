@@ -1,46 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks
+import itertools
+import json
+from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, File, BackgroundTasks
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from datetime import datetime
-import json
+from typing import Optional
 
+from ...core.config import settings
 from ...core.database import get_db
 from ...core.security import get_current_user
-from ...core.config import settings
+from ...core.pagination import paginate, next_cursor
 from ...models.user import User, Generation
-from ...schemas import ImageGenerateRequest, BannerGenerateRequest, LogoGenerateRequest, BackgroundRemoveRequest, GenerationResponse
-from ...services.replicate_service import replicate_service
+from ...schemas import ImageGenerateRequest, BannerGenerateRequest, LogoGenerateRequest, BatchImageRequest, BackgroundRemoveRequest, BatchBackgroundRemoveRequest, GenerationResponse
+from ...services.storage import get_storage
+from ...services.generation_service import (
+    use_job_mode, start_generation, execute_generation, complete_generation, fail_generation,
+    enqueue_generation, start_batch, BatchRun
+)
 
 router = APIRouter(prefix="/images", tags=["Image Generation"])
 
-
-async def deduct_credits(user: User, amount: int, db: AsyncSession):
-    """Deduct credits from user account"""
-    if user.credits < amount:
-        raise HTTPException(status_code=402, detail=f"Insufficient credits. Need {amount}, have {user.credits}")
-    user.credits -= amount
-    await db.commit()
+PLATFORM_SIZES = {
+    "youtube": "1280x720",
+    "facebook": "1200x630",
+    "instagram": "1080x1080",
+    "twitter": "1500x500",
+    "linkedin": "1584x396"
+}
 
 
-async def create_generation(user: User, gen_type: str, prompt: str, settings_dict: dict, db: AsyncSession) -> Generation:
-    """Create a generation record"""
-    gen = Generation(
-        user_id=user.id,
-        type=gen_type,
-        prompt=prompt,
-        settings=json.dumps(settings_dict),
-        status="processing"
-    )
-    db.add(gen)
-    await db.commit()
-    await db.refresh(gen)
-    return gen
+def _check_image_url(image_url: str):
+    """Reject links into our storage that escape it (e.g. "../") before charging"""
+    try:
+        get_storage().key_for_url(image_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("/generate", response_model=GenerationResponse)
 async def generate_image(
     request: ImageGenerateRequest,
     background_tasks: BackgroundTasks,
+    response: Response,
+    async_job: Optional[bool] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -48,48 +51,93 @@ async def generate_image(
     Generate an image from a text prompt.
     Cost: 5 credits
     """
-    credits_cost = settings.CREDITS_IMAGE_GENERATION
-    await deduct_credits(current_user, credits_cost, db)
+    job_mode = use_job_mode(async_job)
     
     # Create generation record
-    gen = await create_generation(
-        current_user, 
+    gen = await start_generation(
+        db,
+        current_user,
         "image", 
         request.prompt,
-        {"size": request.size, "style": request.style},
-        db
+        {"size": request.size, "style": request.style, "seed": request.seed, "no_cache": request.no_cache},
+        status="pending" if job_mode else "processing"
     )
     
+    if job_mode:
+        return await enqueue_generation(gen, response, db)
+    
     try:
         # Generate image
-        output_url = await replicate_service.generate_image(
-            prompt=request.prompt,
-            size=request.size,
-            style=request.style
-        )
+        output_url = await execute_generation(gen)
         
         # Update generation
-        gen.status = "completed"
-        gen.output_url = output_url
-        gen.credits_used = credits_cost
-        gen.completed_at = datetime.utcnow()
-        await db.commit()
-        await db.refresh(gen)
+        await complete_generation(db, gen, output_url)
         
     except Exception as e:
-        gen.status = "failed"
-        gen.error_message = str(e)
         # Refund credits on failure
-        current_user.credits += credits_cost
-        await db.commit()
+        await fail_generation(db, gen, str(e))
         raise HTTPException(status_code=500, detail=str(e))
     
     return gen
 
 
+@router.post("/generate-batch")
+async def generate_image_batch(
+    request: BatchImageRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Generate one image for every prompt x style x platform combination.
+    Credits for the whole batch are debited once; failed items are refunded.
+    Results stream back as NDJSON, one line per item as soon as it finishes.
+    Cost: 5 credits per image
+    """
+    # Check the size before expanding the combinations
+    count = len(request.prompts) * len(request.styles or [None]) * len(request.platforms or [None])
+    if count > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch too large: {count} items, max {settings.BATCH_MAX_ITEMS}"
+        )
+    
+    items = []
+    for prompt, style, platform in itertools.product(
+        request.prompts, request.styles or ["auto"], request.platforms or [None]
+    ):
+        item_settings = {
+            "size": PLATFORM_SIZES.get(platform, "1280x720") if platform else request.size,
+            "style": style,
+            "seed": request.seed,
+            "no_cache": request.no_cache
+        }
+        if platform:
+            item_settings["platform"] = platform
+        items.append((prompt, item_settings))
+    
+    generations = await start_batch(db, current_user, "image", items)
+    positions = {gen.id: index for index, gen in enumerate(generations)}
+    batch = BatchRun(generations)
+    
+    async def results():
+        async for gen in batch.results():
+            line = GenerationResponse.model_validate(gen).model_dump(mode="json")
+            yield json.dumps({"index": positions[gen.id], **line}) + "\n"
+    
+    # Runs after the response, even if the client disconnected before the first line
+    return StreamingResponse(
+        results(),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-Size": str(len(generations))},
+        background=BackgroundTask(batch.close)
+    )
+
+
 @router.post("/banner", response_model=GenerationResponse)
 async def generate_banner(
     request: BannerGenerateRequest,
+    response: Response,
+    async_job: Optional[bool] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -97,19 +145,10 @@ async def generate_banner(
     Generate a banner for social media platforms.
     Cost: 5 credits
     """
-    credits_cost = settings.CREDITS_IMAGE_GENERATION
-    await deduct_credits(current_user, credits_cost, db)
+    job_mode = use_job_mode(async_job)
     
     # Build banner prompt
-    platform_sizes = {
-        "youtube": "1280x720",
-        "facebook": "1200x630",
-        "instagram": "1080x1080",
-        "twitter": "1500x500",
-        "linkedin": "1584x396"
-    }
-    
-    size = platform_sizes.get(request.platform, "1280x720")
+    size = PLATFORM_SIZES.get(request.platform, "1280x720")
     
     prompt = f"""Professional {request.platform} banner design:
 Title: "{request.title}"
@@ -117,27 +156,30 @@ Title: "{request.title}"
 Style: {request.style}, modern, eye-catching
 High quality, professional design, clean typography"""
     
-    gen = await create_generation(
+    gen = await start_generation(
+        db,
         current_user,
         "banner",
         prompt,
-        {"platform": request.platform, "size": size, "style": request.style},
-        db
+        {
+            "platform": request.platform,
+            "size": size,
+            "style": request.style,
+            "seed": request.seed,
+            "no_cache": request.no_cache
+        },
+        status="pending" if job_mode else "processing"
     )
     
+    if job_mode:
+        return await enqueue_generation(gen, response, db)
+    
     try:
-        output_url = await replicate_service.generate_image(prompt=prompt, size=size)
-        gen.status = "completed"
-        gen.output_url = output_url
-        gen.credits_used = credits_cost
-        gen.completed_at = datetime.utcnow()
-        await db.commit()
-        await db.refresh(gen)
+        output_url = await execute_generation(gen)
+        await complete_generation(db, gen, output_url)
     except Exception as e:
-        gen.status = "failed"
-        gen.error_message = str(e)
-        current_user.credits += credits_cost
-        await db.commit()
+        # Refund credits on failure
+        await fail_generation(db, gen, str(e))
         raise HTTPException(status_code=500, detail=str(e))
     
     return gen
@@ -146,6 +188,8 @@ High quality, professional design, clean typography"""
 @router.post("/logo", response_model=GenerationResponse)
 async def generate_logo(
     request: LogoGenerateRequest,
+    response: Response,
+    async_job: Optional[bool] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -153,8 +197,7 @@ async def generate_logo(
     Generate a logo for a brand.
     Cost: 5 credits
     """
-    credits_cost = settings.CREDITS_IMAGE_GENERATION
-    await deduct_credits(current_user, credits_cost, db)
+    job_mode = use_job_mode(async_job)
     
     prompt = f"""Professional logo design for "{request.brand_name}":
 Industry: {request.industry}
@@ -162,27 +205,30 @@ Style: {request.style}, clean, memorable, vector-style
 {f'Colors: {", ".join(request.colors)}' if request.colors else 'Modern color palette'}
 Simple, scalable, professional brand identity"""
     
-    gen = await create_generation(
+    gen = await start_generation(
+        db,
         current_user,
         "logo",
         prompt,
-        {"brand": request.brand_name, "industry": request.industry, "style": request.style},
-        db
+        {
+            "brand": request.brand_name,
+            "industry": request.industry,
+            "style": request.style,
+            "seed": request.seed,
+            "no_cache": request.no_cache
+        },
+        status="pending" if job_mode else "processing"
     )
     
+    if job_mode:
+        return await enqueue_generation(gen, response, db)
+    
     try:
-        output_url = await replicate_service.generate_image(prompt=prompt, size="1024x1024")
-        gen.status = "completed"
-        gen.output_url = output_url
-        gen.credits_used = credits_cost
-        gen.completed_at = datetime.utcnow()
-        await db.commit()
-        await db.refresh(gen)
+        output_url = await execute_generation(gen)
+        await complete_generation(db, gen, output_url)
     except Exception as e:
-        gen.status = "failed"
-        gen.error_message = str(e)
-        current_user.credits += credits_cost
-        await db.commit()
+        # Refund credits on failure
+        await fail_generation(db, gen, str(e))
         raise HTTPException(status_code=500, detail=str(e))
     
     return gen
@@ -191,59 +237,103 @@ Simple, scalable, professional brand identity"""
 @router.post("/remove-background", response_model=GenerationResponse)
 async def remove_background(
     request: BackgroundRemoveRequest,
+    response: Response,
+    async_job: Optional[bool] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Remove background from an image.
+    Runs on Replicate or on the local engine (BACKGROUND_REMOVAL_PROVIDER).
     Cost: 2 credits
     """
-    credits_cost = settings.CREDITS_BACKGROUND_REMOVAL
-    await deduct_credits(current_user, credits_cost, db)
+    _check_image_url(request.image_url)
+    job_mode = use_job_mode(async_job)
     
-    gen = await create_generation(
+    gen = await start_generation(
+        db,
         current_user,
         "background_removal",
         request.image_url,
         {},
-        db
+        status="pending" if job_mode else "processing"
     )
     
+    if job_mode:
+        return await enqueue_generation(gen, response, db)
+    
     try:
-        output_url = await replicate_service.remove_background(image_url=request.image_url)
-        gen.status = "completed"
-        gen.output_url = output_url
-        gen.credits_used = credits_cost
-        gen.completed_at = datetime.utcnow()
-        await db.commit()
-        await db.refresh(gen)
+        output_url = await execute_generation(gen)
+        await complete_generation(db, gen, output_url)
     except Exception as e:
-        gen.status = "failed"
-        gen.error_message = str(e)
-        current_user.credits += credits_cost
-        await db.commit()
+        # Refund credits on failure
+        await fail_generation(db, gen, str(e))
         raise HTTPException(status_code=500, detail=str(e))
     
     return gen
 
 
+@router.post("/remove-background-batch")
+async def remove_background_batch(
+    request: BatchBackgroundRemoveRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Remove the background from many images.
+    Credits for the whole batch are debited once; failed items are refunded.
+    Results stream back as NDJSON, one line per item as soon as it finishes.
+    With BACKGROUND_REMOVAL_PROVIDER=local the items share engine batches.
+    Cost: 2 credits per image
+    """
+    for image_url in request.image_urls:
+        _check_image_url(image_url)
+    
+    generations = await start_batch(
+        db, current_user, "background_removal", [(image_url, {}) for image_url in request.image_urls]
+    )
+    positions = {gen.id: index for index, gen in enumerate(generations)}
+    batch = BatchRun(generations)
+    
+    async def results():
+        async for gen in batch.results():
+            line = GenerationResponse.model_validate(gen).model_dump(mode="json")
+            yield json.dumps({"index": positions[gen.id], **line}) + "\n"
+    
+    # Runs after the response, even if the client disconnected before the first line
+    return StreamingResponse(
+        results(),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-Size": str(len(generations))},
+        background=BackgroundTask(batch.close)
+    )
+
+
 @router.get("/history", response_model=list[GenerationResponse])
 async def get_image_history(
+    response: Response,
     limit: int = 20,
     offset: int = 0,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Get user's image generation history.
+    Pass the X-Next-Cursor header back as `cursor` to fetch the next page.
     """
     image_types = ["image", "banner", "logo", "background_removal"]
     result = await db.execute(
-        select(Generation)
-        .where(Generation.user_id == current_user.id)
-        .where(Generation.type.in_(image_types))
-        .order_by(Generation.created_at.desc())
-        .limit(limit)
-        .offset(offset)
+        paginate(
+            select(Generation)
+            .where(Generation.user_id == current_user.id)
+            .where(Generation.type.in_(image_types)),
+            Generation, limit, cursor, offset
+        )
     )
-    return result.scalars().all()
+    items = result.scalars().all()
+    
+    cursor = next_cursor(items, limit)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+    return items
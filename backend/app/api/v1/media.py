@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+from fastapi.responses import RedirectResponse
+
+from ...core.config import settings
+from ...services.storage import get_storage
+
+router = APIRouter(prefix="/media", tags=["Media"])
+
+
+@router.get("/{key:path}")
+async def get_media(key: str):
+    """
+    Redirect to a short-lived download URL for a stored file.
+    Media bytes never pass through the API; this is what generations
+    point at when the bucket has no CDN in front of it.
+    """
+    url = await get_storage().signed_url(key)
+    # Let clients reuse the redirect while the signature is still valid
+    max_age = max(0, settings.STORAGE_URL_EXPIRY // 2)
+    return RedirectResponse(url, status_code=307, headers={"Cache-Control": f"private, max-age={max_age}"})
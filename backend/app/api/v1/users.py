@@ -1,9 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from ...core.database import get_db
 from ...core.security import get_current_user
+from ...core.pagination import paginate, next_cursor
+from ...core.user_cache import user_cache
+from ...services import stats
 from ...models.user import User, Generation
 from ...schemas import UserResponse, UserUpdate
 
@@ -32,6 +36,7 @@ async def update_profile(
     
     await db.commit()
     await db.refresh(current_user)
+    await user_cache.invalidate(current_user.id)
     return current_user
 
 
@@ -48,22 +53,23 @@ async def get_credits(current_user: User = Depends(get_current_user)):
 async def get_all_history(
     limit: int = 50,
     offset: int = 0,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get all generation history for current user"""
+    """Get all generation history for current user (pass next_cursor back as cursor)"""
     result = await db.execute(
-        select(Generation)
-        .where(Generation.user_id == current_user.id)
-        .order_by(Generation.created_at.desc())
-        .limit(limit)
-        .offset(offset)
+        paginate(
+            select(Generation).where(Generation.user_id == current_user.id),
+            Generation, limit, cursor, offset
+        )
     )
     generations = result.scalars().all()
     
     return {
         "total": len(generations),
-        "items": generations
+        "items": generations,
+        "next_cursor": next_cursor(generations, limit)
     }
 
 
@@ -73,22 +79,4 @@ async def get_user_stats(
     db: AsyncSession = Depends(get_db)
 ):
     """Get user's usage statistics"""
-    result = await db.execute(
-        select(Generation)
-        .where(Generation.user_id == current_user.id)
-        .where(Generation.status == "completed")
-    )
-    generations = result.scalars().all()
-    
-    stats = {
-        "total_generations": len(generations),
-        "credits_used": sum(g.credits_used for g in generations),
-        "by_type": {}
-    }
-    
-    for gen in generations:
-        if gen.type not in stats["by_type"]:
-            stats["by_type"][gen.type] = 0
-        stats["by_type"][gen.type] += 1
-    
-    return stats
+    return await stats.get_user_stats(db, current_user.id)
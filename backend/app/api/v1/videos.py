@@ -1,46 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from datetime import datetime
-import json
+from typing import Optional
+import uuid
 
 from ...core.database import get_db
 from ...core.security import get_current_user
-from ...core.config import settings
+from ...core.pagination import paginate, next_cursor
 from ...models.user import User, Generation
 from ...schemas import VideoGenerateRequest, PresenterVideoRequest, VoiceoverRequest, GenerationResponse
-from ...services.replicate_service import replicate_service
 from ...services.elevenlabs_service import elevenlabs_service
+from ...services.generation_service import (
+    use_job_mode, start_generation, execute_generation, complete_generation, fail_generation,
+    enqueue_generation, finish_generation
+)
 
 router = APIRouter(prefix="/videos", tags=["Video Generation"])
 
 
-async def deduct_credits(user: User, amount: int, db: AsyncSession):
-    """Deduct credits from user account"""
-    if user.credits < amount:
-        raise HTTPException(status_code=402, detail=f"Insufficient credits. Need {amount}, have {user.credits}")
-    user.credits -= amount
-    await db.commit()
-
-
-async def create_generation(user: User, gen_type: str, prompt: str, settings_dict: dict, db: AsyncSession) -> Generation:
-    """Create a generation record"""
-    gen = Generation(
-        user_id=user.id,
-        type=gen_type,
-        prompt=prompt,
-        settings=json.dumps(settings_dict),
-        status="processing"
-    )
-    db.add(gen)
-    await db.commit()
-    await db.refresh(gen)
-    return gen
-
-
 @router.post("/generate", response_model=GenerationResponse)
 async def generate_video(
     request: VideoGenerateRequest,
+    response: Response,
+    async_job: Optional[bool] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -48,10 +32,10 @@ async def generate_video(
     Generate a video from text/topic.
     Cost: 50 credits (30s video)
     """
-    credits_cost = settings.CREDITS_VIDEO_GENERATION
-    await deduct_credits(current_user, credits_cost, db)
+    job_mode = use_job_mode(async_job)
     
-    gen = await create_generation(
+    gen = await start_generation(
+        db,
         current_user,
         "video",
         request.topic,
@@ -61,30 +45,21 @@ async def generate_video(
             "voice": request.voice,
             "script": request.script
         },
-        db
+        status="pending" if job_mode else "processing"
     )
     
+    if job_mode:
+        return await enqueue_generation(gen, response, db)
+    
     try:
         # Generate video
-        output_url = await replicate_service.generate_video(
-            topic=request.topic,
-            script=request.script,
-            duration=request.duration,
-            style=request.style
-        )
+        output_url = await execute_generation(gen)
         
-        gen.status = "completed"
-        gen.output_url = output_url
-        gen.credits_used = credits_cost
-        gen.completed_at = datetime.utcnow()
-        await db.commit()
-        await db.refresh(gen)
+        await complete_generation(db, gen, output_url)
         
     except Exception as e:
-        gen.status = "failed"
-        gen.error_message = str(e)
-        current_user.credits += credits_cost
-        await db.commit()
+        # Refund credits on failure
+        await fail_generation(db, gen, str(e))
         raise HTTPException(status_code=500, detail=str(e))
     
     return gen
@@ -96,6 +71,8 @@ from ...services.local_ai_service import local_ai
 @router.post("/presenter", response_model=GenerationResponse)
 async def generate_presenter_video(
     request: PresenterVideoRequest,
+    response: Response,
+    async_job: Optional[bool] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -103,10 +80,10 @@ async def generate_presenter_video(
     Generate a video with AI presenter using Local Engine (Wav2Lip).
     Cost: 100 credits
     """
-    credits_cost = settings.CREDITS_VIDEO_PRESENTER
-    await deduct_credits(current_user, credits_cost, db)
+    job_mode = use_job_mode(async_job)
     
-    gen = await create_generation(
+    gen = await start_generation(
+        db,
         current_user,
         "presenter_video",
         request.script,
@@ -115,35 +92,22 @@ async def generate_presenter_video(
             "background": request.background,
             "voice_id": request.voice_id
         },
-        db
+        status="pending" if job_mode else "processing"
     )
     
+    if job_mode:
+        return await enqueue_generation(gen, response, db)
+    
     try:
-        # 1. Generate Audio (TTS)
-        audio_url = await local_ai.generate_audio(
-            text=request.script,
-            voice_id=request.voice_id
-        )
-        
-        # 2. Generate Video (LipSync)
+        # TTS, then LipSync
         # In a real app, we would handle background merging here too
-        output_url = await local_ai.generate_lip_sync(
-            audio_url=audio_url,
-            avatar_id=request.avatar_id
-        )
+        output_url = await execute_generation(gen)
         
-        gen.status = "completed"
-        gen.output_url = output_url
-        gen.credits_used = credits_cost
-        gen.completed_at = datetime.utcnow()
-        await db.commit()
-        await db.refresh(gen)
+        await complete_generation(db, gen, output_url)
         
     except Exception as e:
-        gen.status = "failed"
-        gen.error_message = str(e)
-        current_user.credits += credits_cost
-        await db.commit()
+        # Refund credits on failure
+        await fail_generation(db, gen, str(e))
         raise HTTPException(status_code=500, detail=str(e))
     
     return gen
@@ -152,6 +116,8 @@ async def generate_presenter_video(
 @router.post("/voiceover", response_model=GenerationResponse)
 async def generate_voiceover(
     request: VoiceoverRequest,
+    response: Response,
+    async_job: Optional[bool] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -159,40 +125,93 @@ async def generate_voiceover(
     Generate AI voiceover from text using Local TTS.
     Cost: 10 credits
     """
-    credits_cost = settings.CREDITS_VOICEOVER
-    await deduct_credits(current_user, credits_cost, db)
+    job_mode = use_job_mode(async_job)
     
-    gen = await create_generation(
+    gen = await start_generation(
+        db,
         current_user,
         "voiceover",
         request.text,
         {"voice": request.voice, "speed": request.speed},
-        db
+        status="pending" if job_mode else "processing"
     )
     
+    if job_mode:
+        return await enqueue_generation(gen, response, db)
+    
     try:
-        output_url = await local_ai.generate_audio(
-            text=request.text,
-            voice_id=request.voice
-        )
+        output_url = await execute_generation(gen)
         
-        gen.status = "completed"
-        gen.output_url = output_url
-        gen.credits_used = credits_cost
-        gen.completed_at = datetime.utcnow()
-        await db.commit()
-        await db.refresh(gen)
+        await complete_generation(db, gen, output_url)
         
     except Exception as e:
-        gen.status = "failed"
-        gen.error_message = str(e)
-        current_user.credits += credits_cost
-        await db.commit()
+        # Refund credits on failure
+        await fail_generation(db, gen, str(e))
         raise HTTPException(status_code=500, detail=str(e))
     
     return gen
 
 
+@router.post("/voiceover/stream")
+async def stream_voiceover(
+    request: VoiceoverRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Generate AI voiceover and stream the audio (MP3) while it is synthesized.
+    The generation record is finalized when the stream ends; its id and the
+    final file URL are returned in the X-Generation-Id / X-Output-Url headers.
+    Cost: 10 credits
+    """
+    gen = await start_generation(
+        db,
+        current_user,
+        "voiceover",
+        request.text,
+        {"voice": request.voice, "speed": request.speed, "stream": True}
+    )
+    
+    try:
+        output_url, chunks = await local_ai.stream_audio(
+            text=request.text,
+            voice_id=request.voice,
+            speed=request.speed
+        )
+    except Exception as e:
+        # Refund credits on failure
+        await fail_generation(db, gen, str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    outcome = {"error": "Stream cancelled"}
+    
+    async def audio():
+        try:
+            async for chunk in chunks:
+                yield chunk
+            outcome["error"] = None
+        except Exception as e:
+            # Headers are already sent: end the stream and record the failure
+            outcome["error"] = e
+    
+    body = audio()
+    
+    async def finalize():
+        # Release synthesis left suspended by a disconnect
+        await body.aclose()
+        await chunks.aclose()
+        error = outcome["error"]
+        await finish_generation(gen, output_url if error is None else None, error)
+    
+    # finalize runs after the response, also when the client left before the first chunk
+    return StreamingResponse(
+        body,
+        media_type="audio/mpeg",
+        headers={"X-Generation-Id": str(gen.id), "X-Output-Url": output_url},
+        background=BackgroundTask(finalize)
+    )
+
+
 @router.get("/{generation_id}/status", response_model=GenerationResponse)
 async def get_video_status(
     generation_id: str,
@@ -201,10 +220,16 @@ async def get_video_status(
 ):
     """
     Check status of a video generation.
+    To be notified instead of polling, use GET /events/generations/{generation_id}.
     """
+    try:
+        gen_uuid = uuid.UUID(generation_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid UUID format")
+    
     result = await db.execute(
         select(Generation)
-        .where(Generation.id == generation_id)
+        .where(Generation.id == gen_uuid)
         .where(Generation.user_id == current_user.id)
     )
     gen = result.scalar_one_or_none()
@@ -217,21 +242,29 @@ async def get_video_status(
 
 @router.get("/history", response_model=list[GenerationResponse])
 async def get_video_history(
+    response: Response,
     limit: int = 20,
     offset: int = 0,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Get user's video generation history.
+    Pass the X-Next-Cursor header back as `cursor` to fetch the next page.
     """
     video_types = ["video", "presenter_video", "voiceover"]
     result = await db.execute(
-        select(Generation)
-        .where(Generation.user_id == current_user.id)
-        .where(Generation.type.in_(video_types))
-        .order_by(Generation.created_at.desc())
-        .limit(limit)
-        .offset(offset)
+        paginate(
+            select(Generation)
+            .where(Generation.user_id == current_user.id)
+            .where(Generation.type.in_(video_types)),
+            Generation, limit, cursor, offset
+        )
     )
-    return result.scalars().all()
+    items = result.scalars().all()
+    
+    cursor = next_cursor(items, limit)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+    return items
@@ -14,6 +14,12 @@ class Settings(BaseSettings):
     
     # Database - SQLite for local dev, PostgreSQL for production
     DATABASE_URL: str = "sqlite+aiosqlite:///./adsapp.db"
+    # Connection pool (PostgreSQL). Generation routes only hold a connection
+    # while they query, never while waiting on providers, so this bounds
+    # concurrent queries rather than concurrent generations.
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # seconds to wait for a free connection
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
@@ -23,21 +29,96 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # Authenticated user cache
+    USER_CACHE_TTL_SECONDS: int = 60  # Redis tier
+    USER_CACHE_LOCAL_TTL_SECONDS: int = 5  # process-local tier
+    
     # AI Services
     REPLICATE_API_TOKEN: str = ""
     OPENAI_API_KEY: str = ""
     ELEVENLABS_API_KEY: str = ""
     HEYGEN_API_KEY: str = ""
     
+    # Replicate predictions
+    REPLICATE_MAX_CONCURRENCY: int = 50  # in-flight predictions per process
+    REPLICATE_POLL_INTERVAL: float = 1.0  # seconds, backs off to 5s
+    REPLICATE_PREDICTION_TIMEOUT: int = 900  # seconds
+    
+    # ElevenLabs / shared HTTP client tuning
+    ELEVENLABS_MAX_CONNECTIONS: int = 20
+    ELEVENLABS_MAX_RETRIES: int = 3
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0  # seconds an idle connection is kept
+    
     # Storage
+    STORAGE_BACKEND: str = "local"  # "local" (static/generations) or "s3"
     S3_BUCKET_NAME: str = "adsapp-media"
     S3_ACCESS_KEY: str = ""
     S3_SECRET_KEY: str = ""
     S3_ENDPOINT_URL: str = ""
+    S3_REGION: str = "auto"
+    STORAGE_PUBLIC_URL: str = ""  # CDN / public bucket base URL; empty = presigned URLs via /media
+    STORAGE_URL_EXPIRY: int = 3600  # seconds a presigned URL stays valid
+    STORAGE_PART_SIZE: int = 8 * 1024 ** 2  # multipart upload part size (min 5 MB)
+    MEDIA_ACCEL_REDIRECT_PREFIX: str = ""  # e.g. "/_media": hand /static files to nginx (internal location)
+    INGEST_PROVIDER_OUTPUTS: bool = True  # copy provider result URLs (which expire) into storage
+    INGEST_MAX_BYTES: int = 1024 ** 3  # larger outputs keep their provider URL
     
     # CORS
     CORS_ORIGINS: List[str] = ["http://localhost:3000"]
     
+    # Local engine
+    LOCAL_TTS_MAX_CONCURRENCY: int = 8  # concurrent syntheses per process
+    AUDIO_CACHE_MAX_BYTES: int = 2 * 1024 ** 3  # synthesized audio kept for reuse
+    LIPSYNC_SERVER: str = ""  # host:port of local_engine/lipsync_server.py, empty = per-job subprocess
+    LIPSYNC_SEGMENT_SECONDS: int = 20  # split long audio at silences into ~this length, 0 = never split
+    LIPSYNC_MAX_PARALLEL_SEGMENTS: int = 4  # segments rendered at once per process
+    BACKGROUND_REMOVAL_PROVIDER: str = "replicate"  # "replicate" or "local" (local_engine/background.py)
+    BACKGROUND_REMOVAL_MODEL: str = "u2net"  # rembg model kept resident per process
+    BACKGROUND_REMOVAL_BATCH_SIZE: int = 8  # concurrent requests cut out in one engine call
+    BACKGROUND_REMOVAL_BATCH_WAIT_MS: int = 10  # how long a batch waits for more requests
+    
+    # Image result cache (Redis), opt-in
+    IMAGE_CACHE_ENABLED: bool = False
+    # Provider output URLs are temporary: without ingestion, entries must expire before them
+    IMAGE_CACHE_TTL_SECONDS: int = 3000
+    IMAGE_CACHE_MAX_ENTRIES: int = 10000
+    
+    # Generation jobs
+    # When true, generation endpoints queue a Celery job and answer 202
+    # instead of waiting for the provider (overridable per request)
+    ASYNC_GENERATION: bool = False
+    # Batch image generation: items per request and provider calls in flight
+    BATCH_MAX_ITEMS: int = 200
+    BATCH_MAX_CONCURRENCY: int = 8
+    
+    # Rate limiting, shared by all processes through Redis; over-limit work waits
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_MAX_WAIT_SECONDS: int = 600  # give up after queueing this long
+    RATE_LIMIT_LEASE_SECONDS: int = 60  # in-flight slots of crashed processes free up after this
+    REPLICATE_RATE_PER_SECOND: float = 10.0  # prediction creates (Replicate allows 600/min)
+    REPLICATE_MAX_IN_FLIGHT: int = 200  # running predictions across all processes
+    ELEVENLABS_RATE_PER_SECOND: float = 5.0
+    ELEVENLABS_MAX_IN_FLIGHT: int = 5  # concurrent requests allowed by the plan
+    LIPSYNC_MAX_IN_FLIGHT: int = 4  # lip-sync renders on the local engine box
+    USER_MAX_IN_FLIGHT: int = 8  # generations running per user
+    
+    # Identical generations of one user running at the same time share one provider call
+    SINGLE_FLIGHT_ENABLED: bool = True
+    SINGLE_FLIGHT_LOCK_SECONDS: int = 60  # renewed while the call runs
+    SINGLE_FLIGHT_ACROSS_USERS: bool = False  # also share one call (and output) between users
+    
+    # Progress events (SSE): keep-alive interval for idle streams
+    EVENTS_HEARTBEAT_SECONDS: int = 15
+    
+    # Previews rendered by the Celery worker after a generation completes
+    THUMBNAILS_ENABLED: bool = True
+    THUMBNAIL_SIZE: int = 320  # longest side of the WebP thumbnail
+    POSTER_SIZE: int = 1280  # longest side of a video's poster frame
+    THUMBNAIL_QUALITY: int = 75
+    
+    # Admin analytics
+    ANALYTICS_CACHE_SECONDS: int = 30
+    
     # Credits System
     DEFAULT_USER_CREDITS: int = 100
     CREDITS_IMAGE_GENERATION: int = 5
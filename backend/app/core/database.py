@@ -3,10 +3,19 @@ from sqlalchemy.orm import declarative_base
 from .config import settings
 
 # Create async engine
+pool_options = {}
+if not settings.DATABASE_URL.startswith("sqlite"):
+    pool_options = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT
+    }
+
 engine = create_async_engine(
     settings.DATABASE_URL,
     echo=settings.DEBUG,
-    future=True
+    future=True,
+    **pool_options
 )
 
 # Session factory
@@ -33,10 +42,55 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
+def dialect_insert(model):
+    """INSERT construct with ON CONFLICT support for the configured database"""
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+
+async def upsert_increment(db: AsyncSession, model, keys: dict, increments: dict):
+    """Add to counter columns of the row at `keys`, creating it if needed"""
+    stmt = dialect_insert(model).values(**keys, **increments)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={column: getattr(model, column) + stmt.excluded[column] for column in increments}
+    )
+    await db.execute(stmt)
+
+
 async def init_db():
     """Initialize database tables"""
     # Import models here to register them with Base
-    from ..models import User, Generation  # noqa
+    from ..models import User, Generation, CreditTransaction, UserGenerationStats, GenerationRollup, StatsBackfill  # noqa
+    from ..services.stats import backfill_user_stats, backfill_rollups
     
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_create_missing_indexes)
+        await conn.run_sync(backfill_user_stats)
+        await conn.run_sync(backfill_rollups)
+
+
+def _add_missing_columns(conn):
+    """create_all skips existing tables, so add (nullable) columns introduced since"""
+    from sqlalchemy import inspect
+    from sqlalchemy.schema import CreateColumn
+    
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                ddl = CreateColumn(column).compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+
+
+def _create_missing_indexes(conn):
+    """create_all skips existing tables, so add indexes introduced since"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
@@ -0,0 +1,66 @@
+import asyncio
+import random
+import httpx
+from typing import Optional
+
+# Statuses worth retrying: rate limiting and transient upstream errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_ERRORS = (httpx.ConnectError, httpx.ReadTimeout, httpx.RemoteProtocolError)
+
+
+def create_http_client(
+    base_url: str,
+    headers: Optional[dict] = None,
+    timeout: float = 30.0,
+    max_connections: int = 100,
+    max_keepalive_connections: int = 20,
+    keepalive_expiry: float = 60.0,
+    http2: bool = True
+) -> httpx.AsyncClient:
+    """Create a pooled, keep-alive HTTP client for a provider API"""
+    return httpx.AsyncClient(
+        base_url=base_url,
+        headers=headers,
+        timeout=httpx.Timeout(timeout, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        ),
+        http2=http2
+    )
+
+
+async def request_with_retry(
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    retries: int = 3,
+    backoff: float = 0.5,
+    idempotent: bool = True,
+    **kwargs
+) -> httpx.Response:
+    """
+    Send a request, retrying 429/5xx responses and connection errors
+    with exponential backoff and jitter. Retry-After is honoured.
+    Pass idempotent=False for billed creates: only failures where the
+    provider did no work (connect errors, 429) are retried then, since a
+    timeout or 5xx may follow a request that was already carried out.
+    """
+    errors = RETRY_ERRORS if idempotent else (httpx.ConnectError,)
+    statuses = RETRY_STATUSES if idempotent else {429}
+    for attempt in range(retries + 1):
+        try:
+            response = await client.request(method, url, **kwargs)
+        except errors:
+            if attempt == retries:
+                raise
+        else:
+            if response.status_code not in statuses or attempt == retries:
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                await asyncio.sleep(float(retry_after))
+                continue
+        
+        await asyncio.sleep(backoff * (2 ** attempt) + random.uniform(0, backoff))
@@ -0,0 +1,165 @@
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+from .config import settings
+
+# Names that are a sha256 of the content (or of everything that determines
+# it) never change, so they can be cached forever.
+CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{64}$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Older random names: cache, but revalidate (cheap 304s thanks to the ETag)
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def is_content_addressed(path: str) -> bool:
+    stem = os.path.basename(path).split(".", 1)[0]
+    return bool(CONTENT_ADDRESSED.match(stem))
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=start-end" range into inclusive offsets.
+    Returns None to serve the whole file (multi-range or malformed),
+    raises ValueError when the range cannot be satisfied.
+    """
+    if size == 0:
+        # No byte range of an empty file exists
+        raise ValueError("empty file")
+    
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header)
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - length), size - 1
+    
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+class MediaFileResponse(Response):
+    """
+    File response with strong ETags, long-lived caching for content-addressed
+    names and single byte-range support (video seeking).
+    The body goes out as zero-copy sendfile when the server supports it, or
+    is handed to nginx with X-Accel-Redirect when MEDIA_ACCEL_REDIRECT_PREFIX is set.
+    """
+    
+    def __init__(self, path: str, stat_result: os.stat_result, url_path: str, byte_range: Optional[Tuple[int, int]] = None):
+        self.path = path
+        self.size = stat_result.st_size
+        self.range = byte_range
+        self.accel_path = None
+        
+        super().__init__(status_code=206 if byte_range else 200)
+        
+        content_addressed = is_content_addressed(path)
+        if content_addressed:
+            etag = os.path.basename(path).split(".", 1)[0]
+        else:
+            etag = f"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"
+        
+        content_type, _ = mimetypes.guess_type(path)
+        self.headers["content-type"] = content_type or "application/octet-stream"
+        self.headers["etag"] = f'"{etag}"'
+        self.headers["last-modified"] = formatdate(stat_result.st_mtime, usegmt=True)
+        self.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL if content_addressed else REVALIDATE_CACHE_CONTROL
+        self.headers["accept-ranges"] = "bytes"
+        
+        if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+            # nginx serves the bytes (sendfile, ranges) and keeps these headers
+            self.status_code = 200
+            self.range = None
+            self.accel_path = f"{settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{url_path}"
+            self.headers["x-accel-redirect"] = self.accel_path
+            self.headers["content-length"] = "0"
+            return
+        
+        start, end = byte_range or (0, self.size - 1)
+        self.headers["content-length"] = str(max(0, end - start + 1))
+        if byte_range:
+            self.headers["content-range"] = f"bytes {start}-{end}/{self.size}"
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or self.accel_path or self.size == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        
+        start, end = self.range or (0, self.size - 1)
+        count = end - start + 1
+        
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.wrapped.fileno(),
+                    "offset": start,
+                    "count": count
+                })
+                return
+            
+            await file.seek(start)
+            while count > 0:
+                chunk = await file.read(min(CHUNK_SIZE, count))
+                if not chunk:
+                    break
+                count -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": count > 0})
+            if count > 0:
+                await send({"type": "http.response.body", "body": b""})
+
+
+class MediaFiles(StaticFiles):
+    """StaticFiles serving MediaFileResponse: immutable caching, 304s and ranges"""
+    
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        if status_code != 200:
+            # html=True 404 pages
+            return super().file_response(full_path, stat_result, scope, status_code)
+        
+        request_headers = Headers(scope=scope)
+        url_path = self.get_path(scope)
+        
+        response = MediaFileResponse(full_path, stat_result, url_path)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if not range_header or settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+            return response
+        if if_range and if_range != response.headers["etag"]:
+            # The client's partial copy is stale: send the whole file
+            return response
+        
+        try:
+            byte_range = _parse_range(range_header, stat_result.st_size)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={"content-range": f"bytes */{stat_result.st_size}", "accept-ranges": "bytes"}
+            )
+        if byte_range is None:
+            return response
+        return MediaFileResponse(full_path, stat_result, url_path, byte_range)
@@ -0,0 +1,42 @@
+import base64
+import uuid
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import Select, tuple_
+
+# Keyset pagination over (created_at, id), newest first.
+# Cursors are opaque to clients: base64 of "<created_at iso>|<id>".
+
+
+def encode_cursor(created_at: datetime, row_id: uuid.UUID) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(query: Select, model, limit: int, cursor: Optional[str] = None, offset: int = 0) -> Select:
+    """
+    Order newest first and seek past the cursor.
+    Without a cursor, `offset` is still honoured for older clients.
+    """
+    query = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        return query.where(tuple_(model.created_at, model.id) < tuple_(created_at, row_id))
+    return query.offset(offset)
+
+
+def next_cursor(items: list, limit: int) -> Optional[str]:
+    """Cursor for the following page, or None on the last page"""
+    if len(items) < limit or not items:
+        return None
+    return encode_cursor(items[-1].created_at, items[-1].id)
@@ -0,0 +1,160 @@
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from .config import settings
+from .redis import get_redis
+
+# Limits shared by every API and worker process through Redis:
+#   - a token bucket per provider (requests per second)
+#   - a leased semaphore per provider and per user (work in flight)
+# Over-limit callers wait their turn instead of failing. If Redis is
+# unreachable the limits are skipped rather than blocking all generations.
+
+# Reserve one token; the balance may go negative, which queues callers in
+# arrival order. Returns the seconds to wait before the reserved call.
+_TAKE_TOKEN = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local max_wait = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate) - 1
+local wait = 0
+if tokens < 0 then
+    wait = -tokens / rate
+    if wait > max_wait then
+        return '-1'
+    end
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil((burst + max_wait * rate) / rate) + 1)
+return tostring(wait)
+"""
+
+# Take a semaphore lease if fewer than `limit` unexpired leases exist
+_ACQUIRE_LEASE = """
+local limit = tonumber(ARGV[1])
+local now = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) < limit then
+    redis.call('ZADD', KEYS[1], now + ttl, ARGV[4])
+    redis.call('EXPIRE', KEYS[1], math.ceil(ttl) + 1)
+    return 1
+end
+return 0
+"""
+
+
+class RateLimiter:
+    """Distributed token buckets and semaphores for provider and user budgets"""
+    
+    def __init__(self):
+        self._scripts = {}
+    
+    def _budget(self, provider: str) -> tuple:
+        """(requests per second or None, max in flight or None) for a provider"""
+        budgets = {
+            "replicate": (settings.REPLICATE_RATE_PER_SECOND, settings.REPLICATE_MAX_IN_FLIGHT),
+            "elevenlabs": (settings.ELEVENLABS_RATE_PER_SECOND, settings.ELEVENLABS_MAX_IN_FLIGHT),
+            "lipsync": (None, settings.LIPSYNC_MAX_IN_FLIGHT),
+        }
+        return budgets[provider]
+    
+    async def _run(self, name: str, source: str, key: str, *args):
+        redis = get_redis()
+        # Scripts are bound to a client; re-register if the client changed
+        script, client = self._scripts.get(name, (None, None))
+        if client is not redis:
+            script = redis.register_script(source)
+            self._scripts[name] = (script, redis)
+        return await script(keys=[key], args=list(args))
+    
+    async def throttle(self, provider: str):
+        """Wait for the provider's request rate budget"""
+        rate, _ = self._budget(provider)
+        if not settings.RATE_LIMIT_ENABLED or not rate:
+            return
+        
+        try:
+            wait = float(await self._run(
+                "take_token", _TAKE_TOKEN, f"ratelimit:rate:{provider}",
+                rate, max(1.0, rate), time.time(), settings.RATE_LIMIT_MAX_WAIT_SECONDS
+            ))
+        except Exception as e:
+            print(f"Rate limiter unavailable, not throttling {provider}: {e}")
+            return
+        
+        if wait < 0:
+            raise Exception(f"{provider} rate limit queue is full, try again later")
+        if wait > 0:
+            await asyncio.sleep(wait)
+    
+    def provider_slot(self, provider: str):
+        """Hold one of the provider's in-flight slots for the duration of a call"""
+        _, limit = self._budget(provider)
+        return self._slot(f"ratelimit:inflight:{provider}", limit, provider)
+    
+    def user_slot(self, user_id):
+        """Hold one of the user's in-flight generation slots"""
+        return self._slot(f"ratelimit:inflight:user:{user_id}", settings.USER_MAX_IN_FLIGHT, "your generations")
+    
+    @asynccontextmanager
+    async def _slot(self, key: str, limit: Optional[int], label: str):
+        if not settings.RATE_LIMIT_ENABLED or not limit:
+            yield
+            return
+        
+        token = uuid.uuid4().hex
+        if not await self._acquire(key, limit, token, label):
+            # Redis unavailable: run unlimited
+            yield
+            return
+        
+        renewer = asyncio.create_task(self._renew(key, token))
+        try:
+            yield
+        finally:
+            renewer.cancel()
+            try:
+                await get_redis().zrem(key, token)
+            except Exception:
+                pass
+    
+    async def _acquire(self, key: str, limit: int, token: str, label: str) -> bool:
+        """Poll for a lease until one frees up. Returns False if Redis is unreachable."""
+        lease = settings.RATE_LIMIT_LEASE_SECONDS
+        deadline = time.monotonic() + settings.RATE_LIMIT_MAX_WAIT_SECONDS
+        delay = 0.05
+        
+        while True:
+            try:
+                if await self._run("acquire_lease", _ACQUIRE_LEASE, key, limit, time.time(), lease, token):
+                    return True
+            except Exception as e:
+                print(f"Rate limiter unavailable, not limiting {label}: {e}")
+                return False
+            
+            if time.monotonic() > deadline:
+                raise Exception(f"Timed out waiting for capacity ({label})")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+    
+    async def _renew(self, key: str, token: str):
+        """Keep a long-running lease alive; a crashed holder's lease just expires"""
+        lease = settings.RATE_LIMIT_LEASE_SECONDS
+        while True:
+            await asyncio.sleep(lease / 3)
+            try:
+                await get_redis().zadd(key, {token: time.time() + lease}, xx=True)
+            except Exception:
+                pass
+
+
+# Singleton instance
+rate_limiter = RateLimiter()
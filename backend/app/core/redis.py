@@ -0,0 +1,22 @@
+import redis.asyncio as aioredis
+from typing import Optional
+
+from .config import settings
+
+_redis: Optional[aioredis.Redis] = None
+
+
+def get_redis() -> aioredis.Redis:
+    """Shared async Redis client, created on first use"""
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _redis
+
+
+async def close_redis():
+    """Close the shared client (called from the app lifespan)"""
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
@@ -2,7 +2,7 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -10,12 +10,14 @@ import uuid
 
 from .config import settings
 from .database import get_db
+from .user_cache import user_cache
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_PREFIX}/auth/login")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_PREFIX}/auth/login", auto_error=False)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -68,11 +70,19 @@ async def get_current_user(
     except ValueError:
         raise HTTPException(status_code=401, detail="Invalid token format")
 
-    result = await db.execute(select(User).where(User.id == uuid_id))
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    # Hot path: serve the row from the user cache when possible
+    user = await user_cache.get(uuid_id, db)
+    if user is None:
+        result = await db.execute(select(User).where(User.id == uuid_id))
+        user = result.scalar_one_or_none()
+        
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        
+        # End the read transaction so no pooled connection stays checked out
+        # while the route waits on Redis or providers
+        await db.commit()
+        await user_cache.set(user)
     
     if not user.is_active:
         raise HTTPException(status_code=403, detail="User is inactive")
@@ -80,6 +90,22 @@ async def get_current_user(
     return user
 
 
+async def get_current_user_for_stream(
+    header_token: Optional[str] = Depends(oauth2_scheme_optional),
+    token: Optional[str] = Query(default=None, description="Access token, for clients that cannot set headers"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get current user from the Authorization header or a ?token= query param (EventSource)"""
+    token = header_token or token
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return await get_current_user(token, db)
+
+
 async def get_current_admin(current_user = Depends(get_current_user)):
     """Verify user is admin"""
     if current_user.role != "admin":
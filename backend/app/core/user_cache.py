@@ -0,0 +1,113 @@
+import json
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import DateTime, Uuid
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from .config import settings
+from .redis import get_redis
+
+
+class UserCache:
+    """
+    Short-lived cache of user rows for get_current_user.
+    A small process-local tier sits in front of Redis. Writers must call
+    invalidate() after committing a change to the row; other processes'
+    local tiers may lag by at most USER_CACHE_LOCAL_TTL_SECONDS.
+    """
+    
+    prefix = "user:"
+    # Columns kept in the cache. Credentials (hashed_password) never leave
+    # the database; on a cached user they are unloaded, and login reads them
+    # with its own query.
+    fields = (
+        "id", "email", "full_name", "credits", "role", "is_active", "is_verified",
+        "avatar_url", "company", "created_at", "updated_at", "last_login"
+    )
+    
+    def __init__(self, max_local_entries: int = 10000):
+        self._local: dict = {}  # user_id -> (expires_at, data)
+        self.max_local_entries = max_local_entries
+    
+    @classmethod
+    def _columns(cls):
+        from ..models.user import User
+        return [User.__table__.columns[name] for name in cls.fields]
+    
+    def _dump(self, user) -> dict:
+        data = {}
+        for column in self._columns():
+            value = getattr(user, column.name)
+            data[column.name] = value.isoformat() if isinstance(value, datetime) else (
+                str(value) if isinstance(value, uuid.UUID) else value
+            )
+        return data
+    
+    def _load(self, data: dict):
+        from ..models.user import User
+        values = {}
+        for column in self._columns():
+            value = data.get(column.name)
+            if value is not None and isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            elif value is not None and isinstance(column.type, Uuid):
+                value = uuid.UUID(value)
+            values[column.name] = value
+        return User(**values)
+    
+    async def get(self, user_id: uuid.UUID, db: AsyncSession):
+        """
+        Return the cached user attached to `db` (no SELECT issued), or None.
+        Attached users can be modified and committed like a queried row.
+        """
+        key = str(user_id)
+        data = None
+        
+        entry = self._local.get(key)
+        if entry and entry[0] > time.monotonic():
+            data = entry[1]
+        else:
+            try:
+                raw = await get_redis().get(self.prefix + key)
+            except Exception:
+                raw = None
+            if raw:
+                data = json.loads(raw)
+                self._set_local(key, data)
+        
+        if data is None:
+            return None
+        
+        user = self._load(data)
+        make_transient_to_detached(user)
+        db.add(user)
+        return user
+    
+    async def set(self, user):
+        data = self._dump(user)
+        key = str(user.id)
+        self._set_local(key, data)
+        try:
+            await get_redis().set(self.prefix + key, json.dumps(data), ex=settings.USER_CACHE_TTL_SECONDS)
+        except Exception:
+            pass
+    
+    async def invalidate(self, user_id: uuid.UUID):
+        key = str(user_id)
+        self._local.pop(key, None)
+        try:
+            await get_redis().delete(self.prefix + key)
+        except Exception:
+            pass
+    
+    def _set_local(self, key: str, data: dict):
+        if len(self._local) >= self.max_local_entries:
+            # Drop the oldest insertion
+            self._local.pop(next(iter(self._local)))
+        self._local[key] = (time.monotonic() + settings.USER_CACHE_LOCAL_TTL_SECONDS, data)
+
+
+user_cache = UserCache()
@@ -4,7 +4,11 @@ from contextlib import asynccontextmanager
 
 from .core.config import settings
 from .core.database import init_db
-from .api.v1 import auth, images, videos, users, admin
+from .core.redis import close_redis
+from .api.v1 import auth, images, videos, users, admin, events, media
+from .services.replicate_service import replicate_service
+from .services.elevenlabs_service import elevenlabs_service
+from .services.ingest_service import ingest_service
 
 
 @asynccontextmanager
@@ -12,9 +16,14 @@ async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
     # Startup
     await init_db()
+    await elevenlabs_service.startup()
     print(f"🚀 {settings.APP_NAME} started!")
     yield
     # Shutdown
+    await replicate_service.close()
+    await ingest_service.close()
+    await elevenlabs_service.shutdown()
+    await close_redis()
     print("👋 Shutting down...")
 
 
@@ -34,6 +43,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Batch-Size", "X-Generation-Id", "X-Output-Url"],
 )
 
 # Include routers
@@ -42,12 +52,15 @@ app.include_router(images.router, prefix=settings.API_V1_PREFIX)
 app.include_router(videos.router, prefix=settings.API_V1_PREFIX)
 app.include_router(users.router, prefix=settings.API_V1_PREFIX)
 app.include_router(admin.router, prefix=settings.API_V1_PREFIX)
+app.include_router(events.router, prefix=settings.API_V1_PREFIX)
+app.include_router(media.router, prefix=settings.API_V1_PREFIX)
 
 # Mount Static Files for Local Generations
-from fastapi.staticfiles import StaticFiles
+# (immutable caching for content-hashed names, ETag/304 and byte ranges)
+from .core.media import MediaFiles
 import os
 os.makedirs("static/generations", exist_ok=True)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", MediaFiles(directory="static"), name="static")
 
 
 @app.get("/")
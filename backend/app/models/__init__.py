@@ -1,3 +1,5 @@
 from .user import User, Generation
+from .credit import CreditTransaction
+from .stats import UserGenerationStats, GenerationRollup, StatsBackfill
 
-__all__ = ["User", "Generation"]
+__all__ = ["User", "Generation", "CreditTransaction", "UserGenerationStats", "GenerationRollup", "StatsBackfill"]
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, String, Integer, DateTime, Uuid
+from datetime import datetime
+import uuid
+
+from ..core.database import Base
+
+
+class CreditTransaction(Base):
+    """Append-only ledger of every change to a user's credits"""
+    __tablename__ = "credit_transactions"
+    
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    user_id = Column(Uuid, index=True, nullable=False)
+    
+    # Signed change: negative for debits, positive for refunds/top-ups
+    amount = Column(Integer, nullable=False)
+    balance_after = Column(Integer, nullable=False)
+    
+    # e.g. generation:image | refund:image | admin:<reason>
+    reason = Column(String(255), nullable=False)
+    generation_id = Column(Uuid, nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<CreditTransaction {self.amount} -> {self.balance_after}>"
@@ -0,0 +1,50 @@
+from sqlalchemy import Column, String, Integer, DateTime, Uuid
+from datetime import datetime
+
+from ..core.database import Base
+
+
+class UserGenerationStats(Base):
+    """Per-user counters of completed generations, one row per type"""
+    __tablename__ = "user_generation_stats"
+    
+    user_id = Column(Uuid, primary_key=True)
+    type = Column(String(50), primary_key=True)
+    
+    count = Column(Integer, nullable=False, default=0)
+    credits_used = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<UserGenerationStats {self.type}: {self.count}>"
+
+
+class GenerationRollup(Base):
+    """
+    Pre-aggregated generation counts per time bucket.
+    Updated as generations finish, so analytics never scan `generations`.
+    """
+    __tablename__ = "generation_rollups"
+    
+    # Granularity: hour | day
+    granularity = Column(String(10), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    type = Column(String(50), primary_key=True)
+    # Status: completed | failed
+    status = Column(String(20), primary_key=True)
+    
+    count = Column(Integer, nullable=False, default=0)
+    credits_used = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<GenerationRollup {self.granularity} {self.bucket_start} {self.type}/{self.status}>"
+
+
+class StatsBackfill(Base):
+    """One row per counters table that has been seeded from history"""
+    __tablename__ = "stats_backfills"
+    
+    name = Column(String(50), primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<StatsBackfill {self.name}>"
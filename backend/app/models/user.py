@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, Uuid
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, Uuid, Index
 from datetime import datetime
 import uuid
 
@@ -28,7 +28,7 @@ class User(Base):
     company = Column(String(255), nullable=True)
     
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     last_login = Column(DateTime, nullable=True)
     
@@ -39,6 +39,13 @@ class User(Base):
 class Generation(Base):
     """Track all generations (images/videos)"""
     __tablename__ = "generations"
+    __table_args__ = (
+        # History pages seek on (created_at, id) within a user (and type)
+        Index("ix_generations_user_type_created", "user_id", "type", "created_at"),
+        Index("ix_generations_user_created", "user_id", "created_at"),
+        # Admin analytics counts the (few) in-flight rows next to the rollups
+        Index("ix_generations_status", "status"),
+    )
     
     id = Column(Uuid, primary_key=True, default=uuid.uuid4)
     user_id = Column(Uuid, index=True, nullable=False)
@@ -56,6 +63,7 @@ class Generation(Base):
     # Output
     output_url = Column(String(500), nullable=True)
     thumbnail_url = Column(String(500), nullable=True)
+    poster_url = Column(String(500), nullable=True)  # videos: full-size first frame
     
     # Cost
     credits_used = Column(Integer, default=0)
@@ -2,16 +2,16 @@ from .schemas import (
     UserCreate, UserLogin, UserResponse, UserUpdate,
     Token, TokenData,
     GenerationCreate, GenerationResponse,
-    ImageGenerateRequest, BannerGenerateRequest, LogoGenerateRequest, BackgroundRemoveRequest,
+    ImageGenerateRequest, BannerGenerateRequest, LogoGenerateRequest, BatchImageRequest, BackgroundRemoveRequest, BatchBackgroundRemoveRequest,
     VideoGenerateRequest, PresenterVideoRequest, VoiceoverRequest,
-    AdminUserUpdate, AnalyticsResponse, CreditsUpdate
+    AdminUserUpdate, AnalyticsResponse, AnalyticsBucket, CreditsUpdate
 )
 
 __all__ = [
     "UserCreate", "UserLogin", "UserResponse", "UserUpdate",
     "Token", "TokenData",
     "GenerationCreate", "GenerationResponse",
-    "ImageGenerateRequest", "BannerGenerateRequest", "LogoGenerateRequest", "BackgroundRemoveRequest",
+    "ImageGenerateRequest", "BannerGenerateRequest", "LogoGenerateRequest", "BatchImageRequest", "BackgroundRemoveRequest", "BatchBackgroundRemoveRequest",
     "VideoGenerateRequest", "PresenterVideoRequest", "VoiceoverRequest",
-    "AdminUserUpdate", "AnalyticsResponse", "CreditsUpdate"
+    "AdminUserUpdate", "AnalyticsResponse", "AnalyticsBucket", "CreditsUpdate"
 ]
@@ -1,7 +1,10 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, field_validator
 from typing import Optional
 from datetime import datetime
 from uuid import UUID
+import json
+
+from ..core.config import settings
 
 
 # ============ User Schemas ============
@@ -75,11 +78,20 @@ class GenerationResponse(GenerationBase):
     status: str
     output_url: Optional[str] = None
     thumbnail_url: Optional[str] = None
+    poster_url: Optional[str] = None
     credits_used: int
     error_message: Optional[str] = None
     created_at: datetime
     completed_at: Optional[datetime] = None
     
+    @field_validator("settings", mode="before")
+    @classmethod
+    def parse_settings(cls, value):
+        """Generation.settings is stored as a JSON string"""
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+    
     class Config:
         from_attributes = True
 
@@ -90,6 +102,8 @@ class ImageGenerateRequest(BaseModel):
     prompt: str = Field(min_length=3, description="Describe the image you want")
     size: str = Field(default="1024x1024", description="Image size")
     style: Optional[str] = Field(default="auto", description="Style preset")
+    seed: Optional[int] = Field(default=None, description="Fixed seed for reproducible output")
+    no_cache: bool = Field(default=False, description="Skip the result cache and force a fresh generation")
 
 
 class BannerGenerateRequest(BaseModel):
@@ -98,6 +112,8 @@ class BannerGenerateRequest(BaseModel):
     platform: str = Field(default="youtube", description="Target platform")
     style: str = Field(default="modern", description="Design style")
     colors: Optional[list] = Field(default=None, description="Brand colors")
+    seed: Optional[int] = Field(default=None, description="Fixed seed for reproducible output")
+    no_cache: bool = Field(default=False, description="Skip the result cache and force a fresh generation")
 
 
 class LogoGenerateRequest(BaseModel):
@@ -105,12 +121,27 @@ class LogoGenerateRequest(BaseModel):
     industry: str = Field(description="Business industry")
     style: str = Field(default="minimal", description="Logo style")
     colors: Optional[list] = Field(default=None, description="Brand colors")
+    seed: Optional[int] = Field(default=None, description="Fixed seed for reproducible output")
+    no_cache: bool = Field(default=False, description="Skip the result cache and force a fresh generation")
+
+
+class BatchImageRequest(BaseModel):
+    prompts: list[str] = Field(min_length=1, max_length=settings.BATCH_MAX_ITEMS, description="Prompts to generate")
+    styles: Optional[list[str]] = Field(default=None, max_length=settings.BATCH_MAX_ITEMS, description="Styles to combine with every prompt")
+    platforms: Optional[list[str]] = Field(default=None, max_length=settings.BATCH_MAX_ITEMS, description="Platforms (sizes) to combine with every prompt and style")
+    size: str = Field(default="1024x1024", description="Image size when no platforms are given")
+    seed: Optional[int] = Field(default=None, description="Fixed seed for reproducible output")
+    no_cache: bool = Field(default=False, description="Skip the result cache and force a fresh generation")
 
 
 class BackgroundRemoveRequest(BaseModel):
     image_url: str = Field(description="URL of image to process")
 
 
+class BatchBackgroundRemoveRequest(BaseModel):
+    image_urls: list[str] = Field(min_length=1, max_length=settings.BATCH_MAX_ITEMS, description="URLs of images to process")
+
+
 # ============ Video Schemas ============
 
 class VideoGenerateRequest(BaseModel):
@@ -148,3 +179,15 @@ class AnalyticsResponse(BaseModel):
     total_generations: int
     credits_consumed: int
     popular_types: dict
+
+
+class AnalyticsBucket(BaseModel):
+    granularity: str
+    bucket_start: datetime
+    type: str
+    status: str
+    count: int
+    credits_used: int
+    
+    class Config:
+        from_attributes = True
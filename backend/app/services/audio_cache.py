@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from ..core.config import settings
+
+
+class AudioCache:
+    """
+    Content-addressed cache of synthesized audio.
+    Files are named by a hash of the normalized text and voice parameters,
+    and the directory is kept under a byte budget with LRU eviction.
+    Files can be evicted at any time: callers that need one to outlive the
+    cache entry ask for their own link to it (`link_to`), and published media
+    is stored as a separate copy.
+    """
+    
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index: Optional[OrderedDict] = None  # key -> size, oldest first
+        self._total = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key(text: str, voice_id: Optional[str], speed: float = 1.0) -> str:
+        """Hash of the normalized request; equal requests share one file"""
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        payload = json.dumps([normalized, voice_id or "default", round(speed, 2)])
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def path_for(self, key: str) -> Path:
+        return self.directory / f"{key}.wav"
+    
+    def _load_index(self):
+        # Rebuilt from disk on first use so the LRU order survives restarts
+        if self._index is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            entries = sorted(
+                (entry.stat().st_mtime, os.path.splitext(entry.name)[0], entry.stat().st_size)
+                for entry in os.scandir(self.directory)
+                if entry.is_file() and entry.name.endswith(".wav")
+            )
+            self._index = OrderedDict((key, size) for _, key, size in entries)
+            self._total = sum(self._index.values())
+    
+    def get(self, key: str, link_to: Optional[Path] = None) -> Optional[Path]:
+        """
+        Return the cached file and mark it recently used.
+        With `link_to`, the file is also linked there and that path is returned.
+        """
+        path = self.path_for(key)
+        with self._lock:
+            self._load_index()
+            if not path.exists():
+                self._forget(key)
+                return None
+            if key not in self._index:
+                # Written by another process sharing the directory
+                self._index[key] = path.stat().st_size
+                self._total += self._index[key]
+            self._index.move_to_end(key)
+            self._link(path, link_to)
+        os.utime(path)
+        return link_to or path
+    
+    def put(self, key: str, source: Path, link_to: Optional[Path] = None) -> Path:
+        """Move a freshly synthesized file into the cache (see get for `link_to`)"""
+        path = self.path_for(key)
+        with self._lock:
+            self._load_index()
+            os.replace(source, path)
+            self._forget(key)
+            self._index[key] = path.stat().st_size
+            self._total += self._index[key]
+            self._link(path, link_to)
+            self._evict()
+        return link_to or path
+    
+    def _link(self, path: Path, target: Optional[Path]):
+        """Give the caller its own name for the file, which eviction cannot remove"""
+        if target is None:
+            return
+        target.unlink(missing_ok=True)
+        try:
+            os.link(path, target)
+        except OSError:
+            # Not on the same filesystem
+            shutil.copyfile(path, target)
+    
+    def _forget(self, key: str):
+        size = self._index.pop(key, None)
+        if size is not None:
+            self._total -= size
+    
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+
+
+audio_cache = AudioCache(Path("static/generations/tts"), settings.AUDIO_CACHE_MAX_BYTES)
@@ -0,0 +1,155 @@
+import uuid
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.user_cache import user_cache
+from ..models.user import User
+from ..models.credit import CreditTransaction
+
+# Credit changes are single conditional UPDATE ... RETURNING statements, so
+# concurrent requests from one user cannot overdraw, plus one ledger row.
+# With commit=False the caller owns the transaction and must invalidate
+# the user cache after committing.
+
+
+def _record(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    amount: int,
+    balance: int,
+    reason: str,
+    generation_id: Optional[uuid.UUID]
+):
+    db.add(CreditTransaction(
+        user_id=user_id,
+        amount=amount,
+        balance_after=balance,
+        reason=reason[:255],
+        generation_id=generation_id
+    ))
+
+
+async def _finish(db: AsyncSession, user_id: uuid.UUID, commit: bool):
+    if commit:
+        await db.commit()
+        await user_cache.invalidate(user_id)
+
+
+async def debit_credits(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    amount: int,
+    reason: str,
+    generation_id: Optional[uuid.UUID] = None,
+    commit: bool = True
+) -> int:
+    """
+    Take credits from a user, failing with 402 if the balance is too low.
+    Returns: the new balance.
+    """
+    result = await db.execute(
+        update(User)
+        .where(User.id == user_id, User.credits >= amount)
+        .values(credits=User.credits - amount)
+        .returning(User.credits)
+        .execution_options(synchronize_session=False)
+    )
+    balance = result.scalar_one_or_none()
+    
+    if balance is None:
+        current = await db.execute(select(User.credits).where(User.id == user_id))
+        raise HTTPException(
+            status_code=402,
+            detail=f"Insufficient credits. Need {amount}, have {current.scalar() or 0}"
+        )
+    
+    _record(db, user_id, -amount, balance, reason, generation_id)
+    await _finish(db, user_id, commit)
+    return balance
+
+
+async def refund_credits(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    amount: int,
+    reason: str,
+    generation_id: Optional[uuid.UUID] = None,
+    commit: bool = True
+) -> Optional[int]:
+    """
+    Give credits back to a user.
+    Returns: the new balance, or None if the user no longer exists.
+    """
+    result = await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(credits=User.credits + amount)
+        .returning(User.credits)
+        .execution_options(synchronize_session=False)
+    )
+    balance = result.scalar_one_or_none()
+    
+    if balance is not None:
+        _record(db, user_id, amount, balance, reason, generation_id)
+    await _finish(db, user_id, commit)
+    return balance
+
+
+async def adjust_credits(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    amount: int,
+    reason: str,
+    commit: bool = True
+) -> Optional[int]:
+    """
+    Admin adjustment by a signed amount, clamping the balance at zero.
+    Returns: the new balance, or None if the user does not exist.
+    """
+    result = await db.execute(
+        update(User)
+        .where(User.id == user_id, User.credits + amount >= 0)
+        .values(credits=User.credits + amount)
+        .returning(User.credits)
+        .execution_options(synchronize_session=False)
+    )
+    balance = result.scalar_one_or_none()
+    
+    if balance is None:
+        # Either the user is missing or the adjustment would go negative
+        return await set_credits(db, user_id, 0, reason, commit=commit)
+    
+    _record(db, user_id, amount, balance, reason, None)
+    await _finish(db, user_id, commit)
+    return balance
+
+
+async def set_credits(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    credits: int,
+    reason: str,
+    commit: bool = True
+) -> Optional[int]:
+    """
+    Admin override of the balance; the ledger records the difference.
+    Returns: the new balance, or None if the user does not exist.
+    """
+    result = await db.execute(
+        select(User.credits).where(User.id == user_id).with_for_update()
+    )
+    previous = result.scalar_one_or_none()
+    if previous is None:
+        return None
+    
+    await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(credits=credits)
+        .execution_options(synchronize_session=False)
+    )
+    _record(db, user_id, credits - previous, credits, reason, None)
+    await _finish(db, user_id, commit)
+    return credits
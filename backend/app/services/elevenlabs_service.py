@@ -1,6 +1,8 @@
 import httpx
 from typing import Optional
 from ..core.config import settings
+from ..core.http import create_http_client, request_with_retry
+from ..core.rate_limit import rate_limiter
 
 
 class ElevenLabsService:
@@ -9,6 +11,7 @@ class ElevenLabsService:
     def __init__(self):
         self.api_key = settings.ELEVENLABS_API_KEY
         self.base_url = "https://api.elevenlabs.io/v1"
+        self._client: Optional[httpx.AsyncClient] = None
         
         # Default voice IDs
         self.voices = {
@@ -20,6 +23,31 @@ class ElevenLabsService:
             "shimmer": "ThT5KcBeYPX3keUQqHPh"  # Dorothy - female
         }
     
+    async def startup(self):
+        """Open the pooled client (called from the app lifespan)"""
+        if self._client is None or self._client.is_closed:
+            self._client = create_http_client(
+                base_url=self.base_url,
+                headers={"xi-api-key": self.api_key},
+                timeout=120.0,
+                max_connections=settings.ELEVENLABS_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.ELEVENLABS_MAX_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+            )
+    
+    async def shutdown(self):
+        """Close the pooled client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def _get_client(self) -> httpx.AsyncClient:
+        # Outside the API (e.g. Celery workers) there is no lifespan,
+        # so open the client on first use
+        if self._client is None or self._client.is_closed:
+            await self.startup()
+        return self._client
+    
     async def generate_speech(
         self,
         text: str,
@@ -34,13 +62,16 @@ class ElevenLabsService:
         actual_voice_id = self.voices.get(voice_id, voice_id)
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/text-to-speech/{actual_voice_id}",
-                    headers={
-                        "xi-api-key": self.api_key,
-                        "Content-Type": "application/json"
-                    },
+            client = await self._get_client()
+            async with rate_limiter.provider_slot("elevenlabs"):
+                await rate_limiter.throttle("elevenlabs")
+                response = await request_with_retry(
+                    client,
+                    "POST",
+                    f"/text-to-speech/{actual_voice_id}",
+                    retries=settings.ELEVENLABS_MAX_RETRIES,
+                    # Billed per character: never resend one that may have been synthesized
+                    idempotent=False,
                     json={
                         "text": text,
                         "model_id": "eleven_monolingual_v1",
@@ -49,34 +80,35 @@ class ElevenLabsService:
                             "similarity_boost": 0.75,
                             "speed": speed
                         }
-                    },
-                    timeout=120.0
+                    }
                 )
+            
+            if response.status_code == 200:
+                # In production, upload to S3 and return URL
+                # For now, return a placeholder
+                return f"https://api.elevenlabs.io/audio/{actual_voice_id}"
+            else:
+                raise Exception(f"ElevenLabs API error: {response.text}")
                 
-                if response.status_code == 200:
-                    # In production, upload to S3 and return URL
-                    # For now, return a placeholder
-                    return f"https://api.elevenlabs.io/audio/{actual_voice_id}"
-                else:
-                    raise Exception(f"ElevenLabs API error: {response.text}")
-                    
         except Exception as e:
             raise Exception(f"Speech generation failed: {str(e)}")
     
     async def get_voices(self) -> list:
         """Get available voices"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/voices",
-                    headers={"xi-api-key": self.api_key},
-                    timeout=30.0
-                )
-                
-                if response.status_code == 200:
-                    return response.json().get("voices", [])
-                return []
-                
+            client = await self._get_client()
+            response = await request_with_retry(
+                client,
+                "GET",
+                "/voices",
+                retries=settings.ELEVENLABS_MAX_RETRIES,
+                timeout=30.0
+            )
+            
+            if response.status_code == 200:
+                return response.json().get("voices", [])
+            return []
+            
         except Exception:
             return []
 
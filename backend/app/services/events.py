@@ -0,0 +1,115 @@
+import json
+from typing import Optional
+
+from ..core.config import settings
+from ..core.redis import get_redis
+from ..models.user import Generation
+
+# Generation progress is fanned out over Redis pub/sub, one channel per
+# user, so any API instance can push events produced by any other instance
+# or by the Celery workers.
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+def _channel(user_id) -> str:
+    return f"events:user:{user_id}"
+
+
+def generation_event(gen: Generation, stage: Optional[str] = None, progress: Optional[float] = None) -> dict:
+    """Payload sent to clients for a status change or stage update"""
+    return {
+        "generation_id": str(gen.id),
+        "type": gen.type,
+        "status": gen.status,
+        "stage": stage or gen.status,
+        "progress": progress,
+        "output_url": gen.output_url,
+        "error_message": gen.error_message
+    }
+
+
+async def publish(gen: Generation, stage: Optional[str] = None, progress: Optional[float] = None):
+    """Push an event to the owner's subscribers. Never fails the caller."""
+    try:
+        await get_redis().publish(_channel(gen.user_id), json.dumps(generation_event(gen, stage, progress)))
+    except Exception as e:
+        print(f"Event publish failed: {e}")
+
+
+def _flight_members(flight_key: str) -> str:
+    return f"events:flight:{flight_key}"
+
+
+async def join_flight(flight_key: str, gen: Generation):
+    """
+    Attach a generation to a coalesced provider call (see single_flight),
+    so the stage events of that call are sent to its subscribers too.
+    """
+    member = json.dumps({"generation_id": str(gen.id), "user_id": str(gen.user_id), "type": gen.type})
+    try:
+        redis = get_redis()
+        await redis.sadd(_flight_members(flight_key), member)
+        # Safety net for members left behind by a crashed process
+        await redis.expire(_flight_members(flight_key), 3600)
+    except Exception as e:
+        print(f"Event publish failed: {e}")
+
+
+async def leave_flight(flight_key: str, gen: Generation):
+    member = json.dumps({"generation_id": str(gen.id), "user_id": str(gen.user_id), "type": gen.type})
+    try:
+        await get_redis().srem(_flight_members(flight_key), member)
+    except Exception:
+        pass
+
+
+async def publish_flight(flight_key: str, stage: str, progress: Optional[float] = None):
+    """Push a stage event to every generation waiting on a coalesced call. Never fails the caller."""
+    try:
+        redis = get_redis()
+        for raw in await redis.smembers(_flight_members(flight_key)):
+            member = json.loads(raw)
+            await redis.publish(_channel(member["user_id"]), json.dumps({
+                "generation_id": member["generation_id"],
+                "type": member["type"],
+                "status": "processing",
+                "stage": stage,
+                "progress": progress,
+                "output_url": None,
+                "error_message": None
+            }))
+    except Exception as e:
+        print(f"Event publish failed: {e}")
+
+
+class Subscription:
+    """A live subscription to one user's generation events"""
+
+    def __init__(self, user_id):
+        self._pubsub = get_redis().pubsub()
+        self._channel = _channel(user_id)
+
+    async def open(self) -> "Subscription":
+        await self._pubsub.subscribe(self._channel)
+        return self
+
+    async def next(self) -> Optional[dict]:
+        """
+        Wait for the next event.
+        Returns None after EVENTS_HEARTBEAT_SECONDS without one.
+        """
+        message = await self._pubsub.get_message(
+            ignore_subscribe_messages=True,
+            timeout=settings.EVENTS_HEARTBEAT_SECONDS
+        )
+        return json.loads(message["data"]) if message else None
+
+    async def close(self):
+        await self._pubsub.unsubscribe()
+        await self._pubsub.aclose()
+
+
+async def subscribe(user_id) -> Subscription:
+    """Start listening before reading current state, so no transition is missed"""
+    return await Subscription(user_id).open()
@@ -0,0 +1,337 @@
+import asyncio
+import hashlib
+import json
+import tempfile
+import unicodedata
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..core.database import async_session
+from ..core.rate_limit import rate_limiter
+from ..core.user_cache import user_cache
+from ..models.user import User, Generation
+from .replicate_service import replicate_service
+from .local_ai_service import local_ai
+from .single_flight import single_flight
+from .thumbnail_service import thumbnail_service
+from . import events
+from .credits import debit_credits, refund_credits
+from .stats import record_completion, record_rollups
+
+
+def credits_cost(gen_type: str) -> int:
+    """Credits charged for a generation type"""
+    costs = {
+        "image": settings.CREDITS_IMAGE_GENERATION,
+        "banner": settings.CREDITS_IMAGE_GENERATION,
+        "logo": settings.CREDITS_IMAGE_GENERATION,
+        "background_removal": settings.CREDITS_BACKGROUND_REMOVAL,
+        "video": settings.CREDITS_VIDEO_GENERATION,
+        "presenter_video": settings.CREDITS_VIDEO_PRESENTER,
+        "voiceover": settings.CREDITS_VOICEOVER,
+    }
+    return costs[gen_type]
+
+
+def use_job_mode(async_job: Optional[bool]) -> bool:
+    """Resolve the per-request job flag against the global default"""
+    return settings.ASYNC_GENERATION if async_job is None else async_job
+
+
+async def execute_generation(gen: Generation) -> str:
+    """
+    Run the provider call for a generation record.
+    Everything needed is rebuilt from the stored prompt and settings,
+    so the same record can be processed in the API or in a worker.
+    Waits while the user already has USER_MAX_IN_FLIGHT generations running,
+    and joins an identical generation of the same user that is already running
+    if there is one (any user's with SINGLE_FLIGHT_ACROSS_USERS).
+    Callers commit before calling it, so no pooled DB connection is held
+    while the provider works.
+    Returns: output URL.
+    """
+    async with rate_limiter.user_slot(gen.user_id):
+        key = _flight_key(gen)
+        if key is None:
+            return await _run_provider(gen, lambda stage, progress=None: events.publish(gen, stage, progress))
+        
+        # Every generation waiting on the shared call gets its stage events
+        await events.join_flight(key, gen)
+        try:
+            return await single_flight.run(
+                key, lambda: _run_provider(gen, lambda stage, progress=None: events.publish_flight(key, stage, progress))
+            )
+        finally:
+            await events.leave_flight(key, gen)
+
+
+def _flight_key(gen: Generation) -> Optional[str]:
+    """Key of everything that determines the output; None when coalescing is off for it"""
+    params = json.loads(gen.settings or "{}")
+    if params.pop("no_cache", False):
+        return None
+    prompt = " ".join(unicodedata.normalize("NFC", gen.prompt).split())
+    # Scoped to the user unless sharing results between users is switched on
+    scope = None if settings.SINGLE_FLIGHT_ACROSS_USERS else str(gen.user_id)
+    payload = json.dumps([gen.type, prompt, params, scope], sort_keys=True)
+    return f"{gen.type}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+
+async def _run_provider(gen: Generation, notify) -> str:
+    """`notify(stage, progress=None)` publishes a stage event for the generation(s) waiting on this call"""
+    params = json.loads(gen.settings or "{}")
+    
+    if gen.type == "image":
+        return await replicate_service.generate_image(
+            prompt=gen.prompt,
+            size=params.get("size", "1024x1024"),
+            style=params.get("style", "auto"),
+            seed=params.get("seed"),
+            use_cache=not params.get("no_cache", False)
+        )
+    if gen.type == "banner":
+        return await replicate_service.generate_image(
+            prompt=gen.prompt,
+            size=params.get("size", "1280x720"),
+            seed=params.get("seed"),
+            use_cache=not params.get("no_cache", False)
+        )
+    if gen.type == "logo":
+        return await replicate_service.generate_image(
+            prompt=gen.prompt,
+            size="1024x1024",
+            seed=params.get("seed"),
+            use_cache=not params.get("no_cache", False)
+        )
+    if gen.type == "background_removal":
+        if settings.BACKGROUND_REMOVAL_PROVIDER == "local":
+            return await local_ai.remove_background(image_url=gen.prompt)
+        return await replicate_service.remove_background(image_url=gen.prompt)
+    if gen.type == "video":
+        return await replicate_service.generate_video(
+            topic=gen.prompt,
+            script=params.get("script"),
+            duration=params.get("duration", 30),
+            style=params.get("style", "modern")
+        )
+    if gen.type == "presenter_video":
+        with tempfile.TemporaryDirectory() as work_dir:
+            # A private copy of the audio, so cache eviction can't remove it mid-render
+            audio_path = await local_ai.synthesize_audio(
+                text=gen.prompt,
+                voice_id=params.get("voice_id"),
+                output_path=Path(work_dir) / "audio.wav"
+            )
+            await notify("tts_done")
+            return await local_ai.generate_lip_sync(
+                audio_path=audio_path,
+                avatar_id=params["avatar_id"],
+                on_progress=lambda progress: notify("lip_sync", progress)
+            )
+    if gen.type == "voiceover":
+        return await local_ai.generate_audio(
+            text=gen.prompt,
+            voice_id=params.get("voice", "alloy"),
+            speed=params.get("speed", 1.0)
+        )
+    
+    raise Exception(f"Unknown generation type: {gen.type}")
+
+
+async def start_generation(
+    db: AsyncSession,
+    user: User,
+    gen_type: str,
+    prompt: str,
+    settings_dict: dict,
+    status: str = "processing"
+) -> Generation:
+    """
+    Debit credits and create the generation record in one transaction.
+    Fails with 402 (nothing written) when the balance is too low.
+    """
+    gen = Generation(
+        id=uuid.uuid4(),
+        user_id=user.id,
+        type=gen_type,
+        prompt=prompt,
+        settings=json.dumps(settings_dict),
+        status=status,
+        credits_used=0,
+        created_at=datetime.utcnow()
+    )
+    await debit_credits(
+        db, user.id, credits_cost(gen_type),
+        reason=f"generation:{gen_type}", generation_id=gen.id, commit=False
+    )
+    db.add(gen)
+    await db.commit()
+    await user_cache.invalidate(user.id)
+    await events.publish(gen)
+    return gen
+
+
+async def start_batch(
+    db: AsyncSession,
+    user: User,
+    gen_type: str,
+    items: list
+) -> list:
+    """
+    Debit credits for a whole batch and create all its records in one transaction.
+    `items` is a list of (prompt, settings_dict) pairs.
+    """
+    now = datetime.utcnow()
+    generations = [
+        Generation(
+            id=uuid.uuid4(),
+            user_id=user.id,
+            type=gen_type,
+            prompt=prompt,
+            settings=json.dumps(settings_dict),
+            status="processing",
+            credits_used=0,
+            created_at=now
+        )
+        for prompt, settings_dict in items
+    ]
+    await debit_credits(
+        db, user.id, credits_cost(gen_type) * len(generations),
+        reason=f"generation:batch:{gen_type}:{len(generations)}", commit=False
+    )
+    db.add_all(generations)
+    await db.commit()
+    await user_cache.invalidate(user.id)
+    return generations
+
+
+class BatchRun:
+    """
+    Runs a batch created by start_batch with at most BATCH_MAX_CONCURRENCY
+    provider calls in flight; results() yields each record as soon as it
+    finishes, and failed items are refunded one by one.
+    close() must run once the consumer is done (e.g. as the response's
+    background task): it cancels and refunds every item that did not finish,
+    also when results() was never started because the client left early.
+    """
+    
+    def __init__(self, generations: list):
+        self.generations = generations
+        self._tasks = []
+        self._finished = set()
+    
+    async def results(self) -> AsyncIterator[Generation]:
+        slots = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+        
+        async def run_one(gen: Generation):
+            async with slots:
+                try:
+                    return gen, await execute_generation(gen), None
+                except Exception as e:
+                    return gen, None, e
+        
+        self._tasks = [asyncio.create_task(run_one(gen)) for gen in self.generations]
+        for next_done in asyncio.as_completed(self._tasks):
+            gen, output_url, error = await next_done
+            # Claimed before finalizing; shielded so it still lands if the stream is cancelled
+            self._finished.add(gen.id)
+            await asyncio.shield(finish_generation(gen, output_url, error))
+            yield gen
+    
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        for gen in self.generations:
+            if gen.id not in self._finished:
+                self._finished.add(gen.id)
+                await finish_generation(gen, error="Batch cancelled")
+
+
+async def finish_generation(
+    gen: Generation,
+    output_url: Optional[str] = None,
+    error: Optional[object] = None
+):
+    """
+    Complete (or, given an error, fail and refund) a generation from a
+    streaming response. Uses its own short session: the request's session
+    is already closed while the response streams.
+    """
+    async with async_session() as db:
+        db.add(gen)
+        if error is None:
+            await complete_generation(db, gen, output_url)
+        else:
+            await fail_generation(db, gen, str(error))
+
+
+async def complete_generation(db: AsyncSession, gen: Generation, output_url: str):
+    """Record a successful generation in one commit"""
+    gen.status = "completed"
+    gen.output_url = output_url
+    gen.credits_used = credits_cost(gen.type)
+    gen.completed_at = datetime.utcnow()
+    await record_completion(db, gen)
+    await record_rollups(db, gen)
+    await db.commit()
+    await events.publish(gen)
+    enqueue_thumbnails(gen)
+
+
+def enqueue_thumbnails(gen: Generation):
+    """
+    Queue preview rendering on the worker. Sent from a thread and not waited
+    for: publishing can stall while the broker is unreachable, and a
+    generation without previews is still usable.
+    """
+    if not settings.THUMBNAILS_ENABLED or not thumbnail_service.supports(gen.type):
+        return
+    asyncio.get_running_loop().run_in_executor(None, _queue_thumbnails, str(gen.id))
+
+
+def _queue_thumbnails(generation_id: str):
+    from ..workers.tasks import create_thumbnails
+    
+    try:
+        create_thumbnails.delay(generation_id)
+    except Exception as e:
+        print(f"Could not queue thumbnails for {generation_id}: {e}")
+
+
+async def fail_generation(db: AsyncSession, gen: Generation, error: str):
+    """Record a failed generation and refund its credits in one commit"""
+    gen.status = "failed"
+    gen.error_message = error
+    await record_rollups(db, gen)
+    await refund_credits(
+        db, gen.user_id, credits_cost(gen.type),
+        reason=f"refund:{gen.type}", generation_id=gen.id
+    )
+    await events.publish(gen)
+
+
+async def enqueue_generation(
+    gen: Generation,
+    response: Response,
+    db: AsyncSession
+) -> Generation:
+    """
+    Hand a pending generation to the Celery worker and answer 202.
+    Credits are refunded if the job cannot be queued.
+    """
+    from ..workers.tasks import process_generation
+    
+    try:
+        # Publishing blocks (and retries) while the broker is unreachable: keep it off the event loop
+        await asyncio.to_thread(process_generation.delay, str(gen.id))
+    except Exception as e:
+        await fail_generation(db, gen, f"Could not queue job: {e}")
+        raise HTTPException(status_code=503, detail="Generation queue unavailable")
+    
+    response.status_code = 202
+    return gen
@@ -0,0 +1,55 @@
+import hashlib
+import json
+import time
+from typing import Optional
+
+from ..core.config import settings
+from ..core.redis import get_redis
+
+
+class ImageResultCache:
+    """
+    Redis cache of finished image generations.
+    Keyed by everything that determines the model output; entries expire
+    after IMAGE_CACHE_TTL_SECONDS and the oldest are evicted past
+    IMAGE_CACHE_MAX_ENTRIES.
+    """
+    
+    prefix = "imgcache:"
+    index_key = "imgcache:index"
+    
+    @staticmethod
+    def key(model: str, prompt: str, aspect_ratio: str, output_format: str, seed: Optional[int] = None) -> str:
+        payload = json.dumps([model, prompt, aspect_ratio, output_format, seed])
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    async def get(self, key: str) -> Optional[str]:
+        """Return the cached output URL, or None (also when Redis is down)"""
+        if not settings.IMAGE_CACHE_ENABLED:
+            return None
+        try:
+            return await get_redis().get(self.prefix + key)
+        except Exception:
+            return None
+    
+    async def set(self, key: str, output_url: str):
+        if not settings.IMAGE_CACHE_ENABLED:
+            return
+        try:
+            redis = get_redis()
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.set(self.prefix + key, output_url, ex=settings.IMAGE_CACHE_TTL_SECONDS)
+                pipe.zadd(self.index_key, {key: time.time()})
+                await pipe.execute()
+            
+            # Evict the oldest entries beyond the size bound
+            overflow = await redis.zcard(self.index_key) - settings.IMAGE_CACHE_MAX_ENTRIES
+            if overflow > 0:
+                evicted = await redis.zpopmin(self.index_key, overflow)
+                if evicted:
+                    await redis.delete(*(self.prefix + k for k, _ in evicted))
+        except Exception:
+            pass
+
+
+image_cache = ImageResultCache()
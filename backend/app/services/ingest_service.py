@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from ..core.config import settings
+from ..core.http import create_http_client
+from .storage import get_storage
+
+
+def _write_and_hash(f, sha, chunk: bytes):
+    f.write(chunk)
+    sha.update(chunk)
+
+
+class IngestService:
+    """
+    Copies provider outputs into our storage so generations keep a stable URL
+    (provider URLs such as replicate.delivery expire) and clients download
+    from us instead of the provider.
+    Downloads are spooled to a temp file while being hashed, so memory stays
+    flat; the file is keyed by its sha256, and bytes we already have are not
+    uploaded again.
+    """
+    
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared HTTP client for provider downloads, created on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = create_http_client(
+                base_url="",
+                timeout=120.0,
+                max_connections=20,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+            )
+        return self._client
+    
+    async def close(self):
+        """Close the shared HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def ingest(self, url: str, prefix: str) -> str:
+        """
+        Store the file at a provider `url` under "<prefix>/<sha256><ext>".
+        Media that is already ours is returned as is, and if the copy fails
+        the provider URL is kept so the generation still succeeds.
+        Returns: the URL to save on the generation.
+        """
+        if not settings.INGEST_PROVIDER_OUTPUTS or not url.startswith(("http://", "https://")):
+            return url
+        storage = get_storage()
+        if storage.key_for_url(url) is not None:
+            return url
+        
+        try:
+            return await self._ingest(url, prefix)
+        except Exception as e:
+            print(f"Could not ingest {url}, keeping the provider URL: {e}")
+            return url
+    
+    async def _ingest(self, url: str, prefix: str) -> str:
+        storage = get_storage()
+        fd, temp_name = tempfile.mkstemp(prefix="ingest-")
+        temp = Path(temp_name)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                content_type, digest = await self._download(url, f)
+            
+            key = f"{prefix}/{digest}{self._extension(url, content_type)}"
+            if not await storage.exists(key):
+                await storage.save_file(key, temp, content_type, move=True)
+            return storage.public_url(key)
+        finally:
+            temp.unlink(missing_ok=True)
+    
+    async def _download(self, url: str, f) -> tuple:
+        """Stream `url` into an open file. Returns: (content type, sha256 hex digest)."""
+        sha = hashlib.sha256()
+        size = 0
+        async with self.client.stream("GET", url, follow_redirects=True) as response:
+            if response.status_code != 200:
+                raise Exception(f"HTTP {response.status_code}")
+            async for chunk in response.aiter_bytes(1024 * 1024):
+                size += len(chunk)
+                if size > settings.INGEST_MAX_BYTES:
+                    raise Exception(f"larger than {settings.INGEST_MAX_BYTES} bytes")
+                await asyncio.to_thread(_write_and_hash, f, sha, chunk)
+            content_type = response.headers.get("content-type", "").split(";")[0].strip()
+        return content_type or None, sha.hexdigest()
+    
+    def _extension(self, url: str, content_type: Optional[str]) -> str:
+        suffix = Path(urlparse(url).path).suffix.lower()
+        if suffix and len(suffix) <= 5:
+            return suffix
+        return (content_type and mimetypes.guess_extension(content_type)) or ""
+
+
+# Singleton instance
+ingest_service = IngestService()
@@ -2,8 +2,18 @@
 import os
 import asyncio
 import uuid
+import json
+import re
+import tempfile
+import ipaddress
 from pathlib import Path
+from urllib.parse import urlparse
+from typing import AsyncIterator, Optional, Tuple
 from ..core.config import settings
+from ..core.rate_limit import rate_limiter
+from .audio_cache import audio_cache
+from .ingest_service import ingest_service
+from .storage import get_storage, read_chunks, content_key
 
 # Directory for local AI outputs
 OUTPUT_DIR = Path("static/generations")
@@ -17,68 +27,448 @@ class LocalAIService:
     
     def __init__(self):
         self.engine_path = Path("local_engine")
+        self._tts = None
+        # Bounds concurrent syntheses sharing the resident engine
+        self._tts_slots = asyncio.Semaphore(settings.LOCAL_TTS_MAX_CONCURRENCY)
+        # Bounds lip-sync segments rendered at once across all requests
+        self._lipsync_slots = asyncio.Semaphore(settings.LIPSYNC_MAX_PARALLEL_SEGMENTS)
+        self._background = None
+        # Background removal requests waiting for the next engine batch
+        self._background_requests = None
+        self._background_batcher = None
+    
+    def _load_tts(self):
+        """
+        Import the TTS engine once per process and keep it resident,
+        so requests pay synthesis time only (no interpreter/import startup).
+        Returns None when the engine is not present.
+        """
+        if self._tts is None:
+            try:
+                from local_engine import tts
+            except ImportError:
+                return None
+            self._tts = tts
+        return self._tts
+    
+    def _load_background(self):
+        """Import the background removal engine once per process (None when not present)"""
+        if self._background is None:
+            try:
+                from local_engine import background
+            except ImportError:
+                return None
+            self._background = background
+        return self._background
         
-    async def generate_audio(self, text: str, voice_id: str) -> str:
+    async def generate_audio(self, text: str, voice_id: str, speed: float = 1.0) -> str:
+        """
+        Generate audio and store it through the media storage backend.
+        Returns: URL of the generated audio file.
+        """
+        path = await self.synthesize_audio(text, voice_id, speed)
+        return await self._publish(path, "audio/mpeg")
+
+    async def synthesize_audio(self, text: str, voice_id: str, speed: float = 1.0, output_path: Optional[Path] = None) -> Path:
         """
-        Generate audio using local TTS (Coqui/XTTS).
-        Returns: URL path to the generated audio file.
+        Generate audio using the resident local TTS engine (Edge TTS).
+        Identical requests are served from the content-addressed audio cache.
+        Cache files can be evicted at any time; pass `output_path` to get a
+        copy that stays put (e.g. as lip-sync input).
+        Returns: local path of the audio file.
         """
-        filename = f"{uuid.uuid4()}.wav"
-        output_path = OUTPUT_DIR / filename
+        tts = self._load_tts()
         
-        # Command to run local TTS script
-        # In a real setup, this runs: python local_engine/tts.py --text "..." --out "..."
-        cmd = f'python {self.engine_path}/tts.py --text "{text}" --voice "{voice_id}" --output "{output_path}"'
+        # Simulation for now (since we don't have the heavy weights installed)
+        # We will create a dummy file if the engine is missing
+        if tts is None:
+            print("Local TTS engine not found. Using simulation.")
+            temp_path = OUTPUT_DIR / f"{uuid.uuid4()}.part"
+            await self._create_dummy_audio(temp_path)
+            path = OUTPUT_DIR / (await content_key("audio", temp_path)).replace(".part", ".wav")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(temp_path, path)
+            return path
         
-        print(f"Executing Local TTS: {cmd}")
+        key = audio_cache.key(text, voice_id, speed)
+        cached = audio_cache.get(key, link_to=output_path)
+        if cached is None:
+            temp_path = audio_cache.directory / f"{uuid.uuid4()}.part"
+            async with self._tts_slots:
+                try:
+                    await tts.generate_voice_async(text, voice_id, str(temp_path), speed=speed)
+                except Exception as e:
+                    temp_path.unlink(missing_ok=True)
+                    raise Exception(f"Local TTS failed: {e}")
+            cached = audio_cache.put(key, temp_path, link_to=output_path)
+
+        return cached
+
+    async def stream_audio(self, text: str, voice_id: str, speed: float = 1.0) -> Tuple[str, AsyncIterator[bytes]]:
+        """
+        Streaming variant of generate_audio.
+        Returns the final URL (known up front, the file is content-addressed)
+        and an iterator of audio chunks. New audio is written to the cache
+        as it is sent and is stored once synthesis has finished.
+        """
+        tts = self._load_tts()
+        key = audio_cache.key(text, voice_id, speed)
         
-        # Simulation for now (since we don't have the heavy weights installed)
-        # We will create a dummy file if the script fails or is missing
-        if not (self.engine_path / "tts.py").exists():
-            print("Local TTS script not found. Using simulation.")
-            await self._create_dummy_audio(output_path)
-        else:
-            # Run the actual process
+        if tts is None or audio_cache.get(key) is not None:
+            # Cached (or simulated): stream the finished file
+            path = await self.synthesize_audio(text, voice_id, speed)
+            url = await self._publish(path, "audio/mpeg")
+            # Prefer the published copy, which eviction cannot remove mid-stream
+            published = get_storage().local_path(self._storage_key(path))
+            return url, read_chunks(published or path, 64 * 1024)
+        
+        url = get_storage().public_url(self._storage_key(audio_cache.path_for(key)))
+        return url, self._synthesize_chunks(tts, key, text, voice_id, speed)
+    
+    async def _synthesize_chunks(self, tts, key: str, text: str, voice_id: str, speed: float) -> AsyncIterator[bytes]:
+        temp_path = audio_cache.directory / f"{uuid.uuid4()}.part"
+        complete = False
+        async with self._tts_slots:
+            try:
+                with open(temp_path, "wb") as f:
+                    async for chunk in tts.stream_voice_async(text, voice_id, speed=speed):
+                        f.write(chunk)
+                        yield chunk
+                complete = True
+            except Exception as e:
+                raise Exception(f"Local TTS failed: {e}")
+            finally:
+                if not complete:
+                    temp_path.unlink(missing_ok=True)
+        
+        await self._publish(audio_cache.put(key, temp_path), "audio/mpeg")
+    
+    async def remove_background(self, image_url: str) -> str:
+        """
+        Cut out an image's background on the CPU with the resident rembg session.
+        Concurrent requests are grouped into one engine call of up to
+        BACKGROUND_REMOVAL_BATCH_SIZE images, run off the event loop.
+        Returns: URL of the PNG cut-out.
+        """
+        if self._load_background() is None:
+            raise Exception("Local background removal engine not found")
+        image = await self._read_image(image_url)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._background_queue().put_nowait((image, future))
+        output = await future
+        
+        with tempfile.TemporaryDirectory() as work_dir:
+            output_path = Path(work_dir) / "output.png"
+            await asyncio.to_thread(output_path.write_bytes, output)
+            storage = get_storage()
+            key = await content_key("images", output_path)
+            if not await storage.exists(key):
+                await storage.save_file(key, output_path, "image/png", move=True)
+            return storage.public_url(key)
+    
+    async def _read_image(self, image_url: str) -> bytes:
+        """Bytes of an input image: read directly when it is in our storage, otherwise downloaded"""
+        storage = get_storage()
+        key = storage.key_for_url(image_url)
+        if key is None:
+            return await self._download_public(image_url)
+        
+        path = storage.local_path(key)
+        if path is not None:
+            return await asyncio.to_thread(path.read_bytes)
+        return await self._download(await storage.signed_url(key))
+    
+    async def _download_public(self, url: str) -> bytes:
+        """
+        Download a user-supplied URL. It is fetched from our network, so the
+        host must resolve to public addresses only, and the request goes to
+        the address that was checked (a second lookup could be rebound to an
+        internal host). The hostname is still sent as Host and TLS SNI.
+        """
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise Exception("Image URL must be http(s)")
+        try:
+            addresses = await asyncio.get_running_loop().getaddrinfo(parsed.hostname, parsed.port or 443)
+        except OSError as e:
+            raise Exception(f"Could not resolve image host: {e}")
+        ips = [ipaddress.ip_address(address[4][0]) for address in addresses]
+        if not ips or not all(ip.is_global for ip in ips):
+            raise Exception("Image URL must point to a public host")
+        
+        host = f"[{ips[0]}]" if ips[0].version == 6 else str(ips[0])
+        pinned = parsed._replace(netloc=f"{host}:{parsed.port}" if parsed.port else host).geturl()
+        authority = f"{parsed.hostname}:{parsed.port}" if parsed.port else parsed.hostname
+        extensions = {"sni_hostname": parsed.hostname} if parsed.scheme == "https" else {}
+        return await self._download(pinned, headers={"Host": authority}, extensions=extensions)
+    
+    async def _download(self, url: str, **kwargs) -> bytes:
+        """Stream a download into memory, up to INGEST_MAX_BYTES (redirects are not followed)"""
+        data = bytearray()
+        try:
+            async with ingest_service.client.stream("GET", url, **kwargs) as response:
+                if response.status_code != 200:
+                    raise Exception(f"HTTP {response.status_code}")
+                async for chunk in response.aiter_bytes(1024 * 1024):
+                    data.extend(chunk)
+                    if len(data) > settings.INGEST_MAX_BYTES:
+                        raise Exception(f"larger than {settings.INGEST_MAX_BYTES} bytes")
+        except Exception as e:
+            raise Exception(f"Could not fetch image: {e}")
+        return bytes(data)
+    
+    def _background_queue(self) -> asyncio.Queue:
+        """The queue feeding the batching task, (re)started on the running loop"""
+        if self._background_batcher is None or self._background_batcher.done():
+            self._background_requests = asyncio.Queue()
+            self._background_batcher = asyncio.create_task(self._run_background_batches(self._background_requests))
+        return self._background_requests
+    
+    async def _run_background_batches(self, requests: asyncio.Queue):
+        engine = self._load_background()
+        while True:
+            batch = [await requests.get()]
+            if requests.empty():
+                # Give concurrent callers a moment to join this batch
+                await asyncio.sleep(settings.BACKGROUND_REMOVAL_BATCH_WAIT_MS / 1000)
+            while len(batch) < settings.BACKGROUND_REMOVAL_BATCH_SIZE and not requests.empty():
+                batch.append(requests.get_nowait())
+            
+            # Skip callers that went away while waiting
+            batch = [(image, future) for image, future in batch if not future.done()]
+            if not batch:
+                continue
+            
+            try:
+                results = await asyncio.to_thread(
+                    engine.remove_backgrounds, [image for image, _ in batch], settings.BACKGROUND_REMOVAL_MODEL
+                )
+            except Exception as e:
+                results = [e] * len(batch)
+            
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(Exception(f"Local background removal failed: {result}"))
+                else:
+                    future.set_result(result)
+    
+    def _storage_key(self, path: Path) -> str:
+        if path.parent == audio_cache.directory:
+            # Published as a separate copy: cache eviction must not remove served media
+            return f"voiceovers/{path.name}"
+        # Keys mirror the layout under static/generations, so local URLs are unchanged
+        return path.relative_to(OUTPUT_DIR).as_posix()
+    
+    async def _publish(self, path: Path, content_type: str) -> str:
+        """Store a file produced under OUTPUT_DIR (content-addressed ones only once)"""
+        storage = get_storage()
+        key = self._storage_key(path)
+        if not await storage.exists(key):
+            await storage.save_file(key, path, content_type)
+        return storage.public_url(key)
+
+    async def generate_lip_sync(self, audio_path: Path, avatar_id: str, on_progress=None) -> str:
+        """
+        Generate video using Wav2Lip/SadTalker from a local audio file
+        (see synthesize_audio) and store it through the media storage backend.
+        Long audio is split at silences and the segments are rendered
+        concurrently, then joined without re-encoding.
+        `on_progress` is an optional async callback taking the fraction rendered
+        (only reported by the lip-sync server).
+        Returns: URL of the generated video file.
+        """
+        face_path = Path(f"{avatar_id}.jpg")
+        
+        with tempfile.TemporaryDirectory() as work_dir:
+            output_path = Path(work_dir) / "output.mp4"
+            
+            if not settings.LIPSYNC_SERVER and not (self.engine_path / "inference.py").exists():
+                print("Local Inference script not found. Using simulation.")
+                await self._create_dummy_video(output_path)
+            else:
+                segments = await self._split_at_silences(audio_path, Path(work_dir))
+                if len(segments) <= 1:
+                    await self._render_lip_sync(face_path, audio_path, output_path, on_progress)
+                else:
+                    await self._render_segments(face_path, segments, Path(work_dir), output_path, on_progress)
+            
+            # Named by content hash so the file can be cached as immutable
+            storage = get_storage()
+            key = await content_key("videos", output_path)
+            await storage.save_file(key, output_path, "video/mp4", move=True)
+            return storage.public_url(key)
+
+    async def _render_lip_sync(self, face_path: Path, audio_path: Path, output_path: Path, on_progress=None):
+        """Render one clip on the warm server or with a one-off inference process"""
+        async with rate_limiter.provider_slot("lipsync"), self._lipsync_slots:
+            if settings.LIPSYNC_SERVER:
+                # Warm model server: no checkpoint reload per job
+                await self._lip_sync_via_server(face_path, audio_path, output_path, on_progress)
+                return
+            
+            cmd = f'python {self.engine_path}/inference.py --checkpoint_path "checkpoints/wav2lip.pth" --face "{face_path}" --audio "{audio_path}" --outfile "{output_path}"'
+            
+            print(f"Executing Local LipSync: {cmd}")
+            
             proc = await asyncio.create_subprocess_shell(
                 cmd,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
-            stdout, stderr = await proc.communicate()
+            try:
+                stdout, stderr = await proc.communicate()
+            except asyncio.CancelledError:
+                proc.kill()
+                await proc.wait()
+                raise
             if proc.returncode != 0:
-                raise Exception(f"Local TTS failed: {stderr.decode()}")
+                raise Exception(f"Local LipSync failed: {stderr.decode()}")
 
-        return f"/static/generations/{filename}"
+    async def _render_segments(self, face_path: Path, segments: list, work_dir: Path, output_path: Path, on_progress=None):
+        """Render (audio, duration) segments concurrently and concatenate them losslessly"""
+        total = sum(duration for _, duration in segments)
+        done = [0.0] * len(segments)
+        
+        async def render(index: int, segment_audio: Path, duration: float) -> Path:
+            async def segment_progress(fraction: float):
+                done[index] = fraction * duration
+                if on_progress:
+                    await on_progress(round(sum(done) / total, 3))
+            
+            video = work_dir / f"segment_{index:03d}.mp4"
+            await self._render_lip_sync(face_path, segment_audio, video, segment_progress)
+            await segment_progress(1.0)
+            return video
+        
+        tasks = [
+            asyncio.create_task(render(index, segment_audio, duration))
+            for index, (segment_audio, duration) in enumerate(segments)
+        ]
+        try:
+            finished, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in finished:
+                if task.exception():
+                    raise task.exception()
+        finally:
+            # On the first failure (or if we are cancelled) stop the other
+            # segments before the caller removes work_dir under them
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        videos = [task.result() for task in tasks]
+        
+        # Every segment comes out of the same pipeline with identical codec
+        # settings, so the concat demuxer can join them with stream copy
+        playlist = work_dir / "segments.txt"
+        playlist.write_text("".join(f"file '{video.resolve()}'\n" for video in videos))
+        await self._ffmpeg(
+            "-f", "concat", "-safe", "0", "-i", str(playlist),
+            "-c", "copy", str(output_path)
+        )
 
-    async def generate_lip_sync(self, audio_url: str, avatar_id: str) -> str:
+    async def _split_at_silences(self, audio_path: Path, work_dir: Path) -> list:
         """
-        Generate video using Wav2Lip/SadTalker.
-        Returns: URL path to the generated video file.
+        Cut audio longer than LIPSYNC_SEGMENT_SECONDS at the first silence
+        after every LIPSYNC_SEGMENT_SECONDS, so no cut lands inside a word.
+        Returns: [(segment_path, duration), ...], empty when no split is needed.
         """
-        filename = f"{uuid.uuid4()}.mp4"
-        output_path = OUTPUT_DIR / filename
+        target = settings.LIPSYNC_SEGMENT_SECONDS
+        if not target:
+            return []
         
-        # Audio path resolution (convert URL to local path)
-        audio_path = OUTPUT_DIR / Path(audio_url).name
+        duration = await self._probe_duration(audio_path)
+        if duration < target * 1.5:
+            return []
         
-        cmd = f'python {self.engine_path}/inference.py --checkpoint_path "checkpoints/wav2lip.pth" --face "{avatar_id}.jpg" --audio "{audio_path}" --outfile "{output_path}"'
+        log = await self._ffmpeg("-i", str(audio_path), "-af", "silencedetect=noise=-30dB:d=0.3", "-f", "null", "-", loglevel="info")
+        starts = [float(value) for value in re.findall(r"silence_start: ([\d.]+)", log)]
+        ends = [float(value) for value in re.findall(r"silence_end: ([\d.]+)", log)]
+        midpoints = [(start + end) / 2 for start, end in zip(starts, ends)]
         
-        print(f"Executing Local LipSync: {cmd}")
+        cuts = []
+        last = 0.0
+        for point in midpoints:
+            # Keep the tail from becoming a tiny segment of its own
+            if point - last >= target and duration - point >= target / 2:
+                cuts.append(point)
+                last = point
+        if not cuts:
+            return []
+        
+        # Re-encode to PCM so the cuts are sample-accurate
+        await self._ffmpeg(
+            "-i", str(audio_path), "-f", "segment",
+            "-segment_times", ",".join(f"{cut:.3f}" for cut in cuts),
+            "-c:a", "pcm_s16le", str(work_dir / "segment_%03d.wav")
+        )
+        
+        bounds = [0.0] + cuts + [duration]
+        return [
+            (work_dir / f"segment_{index:03d}.wav", bounds[index + 1] - bounds[index])
+            for index in range(len(bounds) - 1)
+        ]
 
-        if not (self.engine_path / "inference.py").exists():
-            print("Local Inference script not found. Using simulation.")
-            await self._create_dummy_video(output_path)
-        else:
-             proc = await asyncio.create_subprocess_shell(
-                cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-             stdout, stderr = await proc.communicate()
-             if proc.returncode != 0:
-                raise Exception(f"Local LipSync failed: {stderr.decode()}")
-                
-        return f"/static/generations/{filename}"
+    async def _probe_duration(self, path: Path) -> float:
+        proc = await asyncio.create_subprocess_exec(
+            "ffprobe", "-v", "error", "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1", str(path),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await proc.communicate()
+        if proc.returncode != 0:
+            raise Exception(f"ffprobe failed: {stderr.decode()}")
+        return float(stdout.decode().strip())
+
+    async def _ffmpeg(self, *args: str, loglevel: str = "error") -> str:
+        """Run ffmpeg and return its log output"""
+        proc = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-y", "-hide_banner", "-loglevel", loglevel, *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await proc.communicate()
+        if proc.returncode != 0:
+            raise Exception(f"ffmpeg failed: {stderr.decode()}")
+        return stderr.decode()
+
+    async def _lip_sync_via_server(self, face_path: Path, audio_path: Path, output_path: Path, on_progress=None):
+        """
+        Send a job to the persistent lip-sync server (local_engine/lipsync_server.py)
+        and wait for it to finish. Paths are absolute since the server has its own cwd.
+        """
+        host, port = settings.LIPSYNC_SERVER.rsplit(":", 1)
+        try:
+            reader, writer = await asyncio.open_connection(host, int(port))
+        except OSError as e:
+            raise Exception(f"Local LipSync server unavailable: {e}")
+        
+        try:
+            request = {
+                "face": str(face_path.resolve()),
+                "audio": str(audio_path.resolve()),
+                "outfile": str(output_path.resolve())
+            }
+            writer.write((json.dumps(request) + "\n").encode())
+            await writer.drain()
+            
+            while True:
+                line = await reader.readline()
+                if not line:
+                    raise Exception("Local LipSync server closed the connection")
+                message = json.loads(line)
+                if "progress" in message:
+                    if on_progress:
+                        await on_progress(message["progress"])
+                    continue
+                if not message.get("ok"):
+                    raise Exception(f"Local LipSync failed: {message.get('error')}")
+                return
+        finally:
+            writer.close()
 
     async def _create_dummy_audio(self, path: Path):
         """Creates a silent dummy audio file for testing"""
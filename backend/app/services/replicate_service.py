@@ -1,23 +1,112 @@
-import replicate
+import asyncio
 import httpx
-from typing import Optional
+from typing import Any, Optional
 from ..core.config import settings
+from ..core.http import RETRY_STATUSES, create_http_client, request_with_retry
+from ..core.rate_limit import rate_limiter
+from .image_cache import image_cache
+from .ingest_service import ingest_service
 
 
 class ReplicateService:
     """Service for Replicate API integration"""
     
     def __init__(self):
-        self.client = replicate.Client(api_token=settings.REPLICATE_API_TOKEN)
+        self.api_token = settings.REPLICATE_API_TOKEN
+        self.base_url = "https://api.replicate.com/v1"
+        self._client: Optional[httpx.AsyncClient] = None
+        # Caps in-flight predictions per process; waiting ones queue here
+        self._slots = asyncio.Semaphore(settings.REPLICATE_MAX_CONCURRENCY)
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared HTTP client, created on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = create_http_client(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_token}"},
+                max_connections=settings.REPLICATE_MAX_CONCURRENCY,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+            )
+        return self._client
+    
+    async def close(self):
+        """Close the shared HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def run(self, model: str, input: dict) -> Any:
+        """
+        Create a prediction and poll it until it finishes.
+        Waits for the shared Replicate budget (rate and in-flight) first.
+        `model` is either "owner/name" or "owner/name:version".
+        Returns: the prediction output.
+        """
+        async with rate_limiter.provider_slot("replicate"), self._slots:
+            await rate_limiter.throttle("replicate")
+            prediction = await self._create_prediction(model, input)
+            try:
+                prediction = await self._wait(prediction)
+            except asyncio.CancelledError:
+                await self._cancel(prediction)
+                raise
+        
+        if prediction["status"] != "succeeded":
+            raise Exception(prediction.get("error") or f"Prediction {prediction['status']}")
+        return prediction.get("output")
+    
+    async def _create_prediction(self, model: str, input: dict) -> dict:
+        if ":" in model:
+            _, version = model.split(":", 1)
+            response = await request_with_retry(self.client, "POST", "/predictions", json={"version": version, "input": input}, idempotent=False)
+        else:
+            response = await request_with_retry(self.client, "POST", f"/models/{model}/predictions", json={"input": input}, idempotent=False)
+        
+        if response.status_code not in (200, 201):
+            raise Exception(f"Replicate API error: {response.text}")
+        return response.json()
+    
+    async def _wait(self, prediction: dict) -> dict:
+        """Poll a prediction with backoff until it reaches a terminal state"""
+        interval = settings.REPLICATE_POLL_INTERVAL
+        deadline = asyncio.get_running_loop().time() + settings.REPLICATE_PREDICTION_TIMEOUT
+        
+        while prediction["status"] not in ("succeeded", "failed", "canceled"):
+            if asyncio.get_running_loop().time() > deadline:
+                await self._cancel(prediction)
+                raise Exception("Prediction timed out")
+            
+            await asyncio.sleep(interval)
+            interval = min(interval * 1.5, 5.0)
+            
+            response = await request_with_retry(self.client, "GET", prediction["urls"]["get"])
+            if response.status_code == 200:
+                prediction = response.json()
+            elif response.status_code not in RETRY_STATUSES:
+                # Auth errors, a deleted prediction...: polling on will not help
+                await self._cancel(prediction)
+                raise Exception(f"Replicate API error: HTTP {response.status_code} polling prediction")
+        
+        return prediction
+    
+    async def _cancel(self, prediction: dict):
+        try:
+            await self.client.post(prediction["urls"]["cancel"])
+        except Exception:
+            pass
     
     async def generate_image(
         self, 
         prompt: str, 
         size: str = "1024x1024",
-        style: str = "auto"
+        style: str = "auto",
+        seed: Optional[int] = None,
+        use_cache: bool = True
     ) -> str:
         """
         Generate image using SDXL or Flux model.
+        Repeats are served from the image result cache unless use_cache is False.
         Cost: ~$0.002 per image
         """
         # Parse size
@@ -34,22 +123,34 @@ class ReplicateService:
         
         enhanced_prompt = f"{prompt}, {style_prompts.get(style, style_prompts['auto'])}"
         
+        model = "black-forest-labs/flux-schnell"
+        model_input = {
+            "prompt": enhanced_prompt,
+            "num_outputs": 1,
+            "aspect_ratio": self._get_aspect_ratio(width, height),
+            "output_format": "png",
+            "output_quality": 90
+        }
+        if seed is not None:
+            model_input["seed"] = seed
+        
+        cache_key = image_cache.key(
+            model, enhanced_prompt, model_input["aspect_ratio"], model_input["output_format"], seed
+        )
+        if use_cache:
+            cached = await image_cache.get(cache_key)
+            if cached:
+                return cached
+        
         try:
             # Using Flux model for high quality
-            output = self.client.run(
-                "black-forest-labs/flux-schnell",
-                input={
-                    "prompt": enhanced_prompt,
-                    "num_outputs": 1,
-                    "aspect_ratio": self._get_aspect_ratio(width, height),
-                    "output_format": "png",
-                    "output_quality": 90
-                }
-            )
+            output = await self.run(model, input=model_input)
             
             # Return first image URL
             if output and len(output) > 0:
-                return str(output[0])
+                output_url = await ingest_service.ingest(self._first_output(output), "images")
+                await image_cache.set(cache_key, output_url)
+                return output_url
             raise Exception("No output generated")
             
         except Exception as e:
@@ -61,7 +162,7 @@ class ReplicateService:
         Cost: ~$0.001 per image
         """
         try:
-            output = self.client.run(
+            output = await self.run(
                 "cjwbw/rembg:fb8af171cfa1616ddcf1242c093f9c46bcada5ad4cf6f2fbe8b81b330ec5c003",
                 input={
                     "image": image_url
@@ -69,7 +170,7 @@ class ReplicateService:
             )
             
             if output:
-                return str(output)
+                return await ingest_service.ingest(self._first_output(output), "images")
             raise Exception("No output generated")
             
         except Exception as e:
@@ -90,7 +191,7 @@ class ReplicateService:
             # Create video prompt from topic
             video_prompt = script or f"A professional video about {topic}, {style} style, high quality cinematography"
             
-            output = self.client.run(
+            output = await self.run(
                 "anotherjesse/zeroscope-v2-xl:9f747673945c62801b13b84701c783929c0ee784e4748ec062204894dda1a351",
                 input={
                     "prompt": video_prompt,
@@ -100,12 +201,18 @@ class ReplicateService:
             )
             
             if output:
-                return str(output)
+                return await ingest_service.ingest(self._first_output(output), "videos")
             raise Exception("No video generated")
             
         except Exception as e:
             raise Exception(f"Video generation failed: {str(e)}")
     
+    def _first_output(self, output: Any) -> str:
+        """Models return either a single URL or a list of URLs"""
+        if isinstance(output, list):
+            return str(output[0])
+        return str(output)
+    
     def _get_aspect_ratio(self, width: int, height: int) -> str:
         """Convert dimensions to aspect ratio string"""
         ratio = width / height
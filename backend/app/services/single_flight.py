@@ -0,0 +1,139 @@
+import asyncio
+import json
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+from ..core.config import settings
+from ..core.redis import get_redis
+
+
+class _Flight:
+    """An in-process call and the number of callers waiting on it"""
+    
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls so the work runs once.
+    Within a process callers share one task; across processes a Redis lock
+    elects a leader and the others wait for the result it publishes.
+    Results are only shared while the call is running - finished results
+    are the caches' job.
+    """
+    
+    lock_prefix = "singleflight:lock:"
+    result_prefix = "singleflight:result:"
+    
+    def __init__(self):
+        self._flights = {}
+    
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `fn`, or join the identical call already in flight under `key`"""
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await fn()
+        
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(self._lead_or_follow(key, fn)))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._flights.pop(key, None))
+        
+        flight.waiters += 1
+        try:
+            # Shielded so one caller going away does not cancel the others' result
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+    
+    async def _lead_or_follow(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        lock_key = self.lock_prefix + key
+        while True:
+            token = uuid.uuid4().hex
+            try:
+                redis = get_redis()
+                if await redis.set(lock_key, token, nx=True, ex=settings.SINGLE_FLIGHT_LOCK_SECONDS):
+                    break
+                leader = await redis.get(lock_key)
+            except Exception:
+                # Redis unavailable: coalesce in-process only
+                return await fn()
+            
+            if leader is None:
+                # Released between the two calls; try to lead again
+                continue
+            
+            outcome = await self._follow(lock_key, leader)
+            if outcome is not None:
+                if not outcome["ok"]:
+                    raise Exception(outcome["error"])
+                return outcome["value"]
+            # The leader went away without a result: take over
+        
+        return await self._lead(key, lock_key, token, fn)
+    
+    async def _lead(self, key: str, lock_key: str, token: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        renewer = asyncio.create_task(self._renew(lock_key, token))
+        outcome = None
+        try:
+            try:
+                value = await fn()
+            except Exception as e:
+                outcome = {"ok": False, "error": str(e)}
+                raise
+            outcome = {"ok": True, "value": value}
+            return value
+        finally:
+            renewer.cancel()
+            try:
+                redis = get_redis()
+                if outcome is not None:
+                    await redis.set(
+                        f"{self.result_prefix}{key}:{token}",
+                        json.dumps(outcome),
+                        ex=settings.SINGLE_FLIGHT_LOCK_SECONDS
+                    )
+                # Cancelled leaders publish nothing; a follower takes over
+                if await redis.get(lock_key) == token:
+                    await redis.delete(lock_key)
+            except Exception:
+                pass
+    
+    async def _follow(self, lock_key: str, leader: str) -> Optional[dict]:
+        """Wait for the leader's outcome; None if it disappeared without one"""
+        result_key = f"{self.result_prefix}{lock_key[len(self.lock_prefix):]}:{leader}"
+        delay = 0.1
+        while True:
+            try:
+                redis = get_redis()
+                result = await redis.get(result_key)
+                if result is None and await redis.get(lock_key) != leader:
+                    # Lock released or expired: the result is there now or never
+                    result = await redis.get(result_key)
+                    if result is None:
+                        return None
+            except Exception:
+                return None
+            
+            if result is not None:
+                return json.loads(result)
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.5, 1.0)
+    
+    async def _renew(self, lock_key: str, token: str):
+        """Keep the lock while a long job runs; a crashed leader's lock expires"""
+        while True:
+            await asyncio.sleep(settings.SINGLE_FLIGHT_LOCK_SECONDS / 3)
+            try:
+                redis = get_redis()
+                if await redis.get(lock_key) == token:
+                    await redis.expire(lock_key, settings.SINGLE_FLIGHT_LOCK_SECONDS)
+            except Exception:
+                pass
+
+
+single_flight = SingleFlight()
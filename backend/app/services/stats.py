@@ -0,0 +1,224 @@
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select, func, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..core.database import dialect_insert, upsert_increment
+from ..core.redis import get_redis
+from ..models.user import User, Generation
+from ..models.stats import UserGenerationStats, GenerationRollup, StatsBackfill
+
+ROLLUP_GRANULARITIES = ("hour", "day")
+
+
+async def record_completion(db: AsyncSession, gen: Generation):
+    """Bump the user's counters; call inside the transaction that completes `gen`"""
+    await upsert_increment(
+        db,
+        UserGenerationStats,
+        {"user_id": gen.user_id, "type": gen.type},
+        {"count": 1, "credits_used": gen.credits_used}
+    )
+
+
+async def get_user_stats(db: AsyncSession, user_id) -> dict:
+    """Usage stats from the counters table: O(number of types)"""
+    result = await db.execute(
+        select(UserGenerationStats.type, UserGenerationStats.count, UserGenerationStats.credits_used)
+        .where(UserGenerationStats.user_id == user_id)
+    )
+    rows = result.all()
+    
+    return {
+        "total_generations": sum(row.count for row in rows),
+        "credits_used": sum(row.credits_used for row in rows),
+        "by_type": {row.type: row.count for row in rows}
+    }
+
+
+def _claim_backfill(conn, name: str) -> bool:
+    """
+    Record that `name` is being seeded, in the caller's transaction.
+    Only the first caller ever gets True: a concurrent claim waits on the key
+    until that transaction ends, then sees the row (or takes over if it
+    rolled back), so each backfill runs exactly once and never half-done.
+    """
+    result = conn.execute(
+        dialect_insert(StatsBackfill).values(name=name).on_conflict_do_nothing()
+    )
+    return result.rowcount == 1
+
+
+def _add_on_conflict(stmt, model, counters: list):
+    """Make a backfill INSERT add to rows that a live completion created meanwhile"""
+    keys = [column.name for column in model.__table__.primary_key]
+    return stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={column: getattr(model, column) + stmt.excluded[column] for column in counters}
+    )
+
+
+def backfill_user_stats(conn):
+    """Seed the counters from existing history, once"""
+    if not _claim_backfill(conn, "user_generation_stats"):
+        return
+    
+    # Rebuilt from scratch: rows counted before the claim are in the history too
+    conn.execute(delete(UserGenerationStats))
+    
+    history = (
+        select(
+            Generation.user_id,
+            Generation.type,
+            func.count(Generation.id),
+            func.coalesce(func.sum(Generation.credits_used), 0)
+        )
+        .where(Generation.status == "completed")
+        .group_by(Generation.user_id, Generation.type)
+    )
+    conn.execute(_add_on_conflict(
+        dialect_insert(UserGenerationStats).from_select(["user_id", "type", "count", "credits_used"], history),
+        UserGenerationStats,
+        ["count", "credits_used"]
+    ))
+
+
+# ============ Analytics rollups ============
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Truncate a timestamp to the start of its hour/day bucket"""
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+async def record_rollups(db: AsyncSession, gen: Generation):
+    """Count a finished generation into its buckets; call inside the finishing transaction"""
+    for granularity in ROLLUP_GRANULARITIES:
+        await upsert_increment(
+            db,
+            GenerationRollup,
+            {
+                "granularity": granularity,
+                "bucket_start": bucket_start(gen.created_at, granularity),
+                "type": gen.type,
+                "status": gen.status
+            },
+            {"count": 1, "credits_used": gen.credits_used or 0}
+        )
+
+
+async def get_rollups(
+    db: AsyncSession,
+    granularity: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    gen_type: Optional[str] = None
+) -> list:
+    """Buckets in [start, end) for the time-series endpoint"""
+    query = (
+        select(GenerationRollup)
+        .where(GenerationRollup.granularity == granularity)
+        .order_by(GenerationRollup.bucket_start)
+    )
+    if start:
+        query = query.where(GenerationRollup.bucket_start >= bucket_start(start, granularity))
+    if end:
+        query = query.where(GenerationRollup.bucket_start < end)
+    if gen_type:
+        query = query.where(GenerationRollup.type == gen_type)
+    
+    result = await db.execute(query)
+    return result.scalars().all()
+
+
+async def get_analytics_snapshot(db: AsyncSession) -> dict:
+    """
+    Platform totals plus user counts. Finished generations come from the
+    daily rollups; the ones still pending or processing (not rolled up until
+    they finish) are counted from the table, so totals cover every generation.
+    The result is cached in Redis for ANALYTICS_CACHE_SECONDS.
+    """
+    cache_key = "analytics:snapshot"
+    try:
+        cached = await get_redis().get(cache_key)
+        if cached:
+            return json.loads(cached)
+    except Exception:
+        pass
+    
+    users = await db.execute(
+        select(func.count(User.id), func.count(User.id).filter(User.is_active == True))
+    )
+    total_users, active_users = users.one()
+    
+    by_type = await db.execute(
+        select(
+            GenerationRollup.type,
+            func.sum(GenerationRollup.count),
+            func.sum(GenerationRollup.credits_used)
+        )
+        .where(GenerationRollup.granularity == "day")
+        .group_by(GenerationRollup.type)
+    )
+    in_flight = await db.execute(
+        select(Generation.type, func.count(Generation.id), func.sum(Generation.credits_used))
+        .where(Generation.status.in_(["pending", "processing"]))
+        .group_by(Generation.type)
+    )
+    totals = defaultdict(lambda: [0, 0])
+    for gen_type, count, credits_used in [*by_type.all(), *in_flight.all()]:
+        totals[gen_type][0] += count or 0
+        totals[gen_type][1] += credits_used or 0
+    
+    snapshot = {
+        "total_users": total_users,
+        "active_users": active_users,
+        "total_generations": sum(count for count, _ in totals.values()),
+        "credits_consumed": sum(credits_used for _, credits_used in totals.values()),
+        "popular_types": {gen_type: count for gen_type, (count, _) in totals.items()}
+    }
+    
+    try:
+        await get_redis().set(cache_key, json.dumps(snapshot), ex=settings.ANALYTICS_CACHE_SECONDS)
+    except Exception:
+        pass
+    return snapshot
+
+
+def backfill_rollups(conn):
+    """Seed the rollups from existing history, once"""
+    if not _claim_backfill(conn, "generation_rollups"):
+        return
+    
+    conn.execute(delete(GenerationRollup))
+    
+    totals = defaultdict(lambda: [0, 0])
+    history = conn.execute(
+        select(Generation.created_at, Generation.type, Generation.status, Generation.credits_used)
+        .where(Generation.status.in_(["completed", "failed"]))
+    )
+    for created_at, gen_type, status, credits_used in history:
+        for granularity in ROLLUP_GRANULARITIES:
+            key = (granularity, bucket_start(created_at, granularity), gen_type, status)
+            totals[key][0] += 1
+            totals[key][1] += credits_used or 0
+    
+    if totals:
+        conn.execute(
+            _add_on_conflict(dialect_insert(GenerationRollup), GenerationRollup, ["count", "credits_used"]),
+            [
+                {
+                    "granularity": granularity,
+                    "bucket_start": start,
+                    "type": gen_type,
+                    "status": status,
+                    "count": count,
+                    "credits_used": credits_used
+                }
+                for (granularity, start, gen_type, status), (count, credits_used) in totals.items()
+            ]
+        )
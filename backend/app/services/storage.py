@@ -0,0 +1,241 @@
+import asyncio
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from ..core.config import settings
+from ..core.media import IMMUTABLE_CACHE_CONTROL, is_content_addressed
+
+# Media produced on the API/worker hosts is written through a storage
+# backend selected by STORAGE_BACKEND. Keys are relative paths such as
+# "tts/<hash>.wav"; public_url(key) is the stable URL saved on generations.
+
+
+async def read_chunks(path: Path, chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+    """Read a file in chunks without blocking the event loop"""
+    with open(path, "rb") as f:
+        while chunk := await asyncio.to_thread(f.read, chunk_size):
+            yield chunk
+
+
+def _digest(path: Path) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+async def content_key(prefix: str, path: Path) -> str:
+    """Key named by the file's sha256, e.g. "videos/<hash>.mp4"; such keys are cached as immutable"""
+    return f"{prefix}/{await asyncio.to_thread(_digest, path)}{path.suffix}"
+
+
+def _checked_key(key: str) -> str:
+    """Keys taken from request URLs must stay inside the storage root"""
+    if not key or key.startswith("/") or "\\" in key or any(part in ("", ".", "..") for part in key.split("/")):
+        raise ValueError("Invalid media path")
+    return key
+
+
+class LocalStorage:
+    """Files under static/generations, served by the /static mount"""
+    
+    def __init__(self, root: Path, url_prefix: str):
+        self.root = root
+        self.url_prefix = url_prefix
+    
+    def path_for(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root.resolve()):
+            raise ValueError("Invalid media path")
+        return path
+    
+    async def exists(self, key: str) -> bool:
+        return self.path_for(key).exists()
+    
+    async def save_file(self, key: str, source: Path, content_type: Optional[str] = None, move: bool = False) -> str:
+        """Store a local file under `key`. Returns: the key."""
+        target = self.path_for(key)
+        if source.resolve() == target.resolve():
+            return key
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if move:
+            await asyncio.to_thread(shutil.move, source, target)
+        else:
+            await asyncio.to_thread(shutil.copyfile, source, target)
+        return key
+    
+    async def save_stream(self, key: str, chunks: AsyncIterator[bytes], content_type: Optional[str] = None) -> str:
+        """Store a byte stream under `key`. Returns: the key."""
+        target = self.path_for(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp = target.with_name(target.name + ".part")
+        try:
+            with open(temp, "wb") as f:
+                async for chunk in chunks:
+                    await asyncio.to_thread(f.write, chunk)
+            os.replace(temp, target)
+        finally:
+            temp.unlink(missing_ok=True)
+        return key
+    
+    async def delete(self, key: str):
+        self.path_for(key).unlink(missing_ok=True)
+    
+    def public_url(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+    
+    def key_for_url(self, url: str) -> Optional[str]:
+        """The key behind a public_url, or None for URLs stored elsewhere (ValueError if it escapes the root)"""
+        prefix = f"{self.url_prefix}/"
+        return _checked_key(url[len(prefix):]) if url.startswith(prefix) else None
+    
+    def local_path(self, key: str) -> Optional[Path]:
+        return self.path_for(key)
+    
+    async def signed_url(self, key: str) -> str:
+        return self.public_url(key)
+
+
+class S3Storage:
+    """
+    S3-compatible bucket (AWS S3, Cloudflare R2, MinIO).
+    Uploads are streamed as multipart uploads of STORAGE_PART_SIZE parts,
+    so memory use stays flat regardless of the file size.
+    """
+    
+    def __init__(self):
+        import boto3
+        from botocore.config import Config
+        
+        self.bucket = settings.S3_BUCKET_NAME
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL or None,
+            aws_access_key_id=settings.S3_ACCESS_KEY or None,
+            aws_secret_access_key=settings.S3_SECRET_KEY or None,
+            region_name=settings.S3_REGION,
+            config=Config(signature_version="s3v4", max_pool_connections=50)
+        )
+    
+    async def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+    
+    async def save_file(self, key: str, source: Path, content_type: Optional[str] = None, move: bool = False) -> str:
+        """Upload a local file under `key`. Returns: the key."""
+        await self.save_stream(key, read_chunks(source), content_type)
+        if move:
+            source.unlink(missing_ok=True)
+        return key
+    
+    async def save_stream(self, key: str, chunks: AsyncIterator[bytes], content_type: Optional[str] = None) -> str:
+        """
+        Upload a byte stream under `key` as it arrives.
+        Streams that fit in one part are sent with a single PUT.
+        Returns: the key.
+        """
+        extra = {"ContentType": content_type} if content_type else {}
+        if is_content_addressed(key):
+            extra["CacheControl"] = IMMUTABLE_CACHE_CONTROL
+        part_size = settings.STORAGE_PART_SIZE
+        buffer = bytearray()
+        upload_id = None
+        parts = []
+        
+        try:
+            async for chunk in chunks:
+                buffer.extend(chunk)
+                while len(buffer) >= part_size:
+                    if upload_id is None:
+                        created = await asyncio.to_thread(
+                            self.client.create_multipart_upload, Bucket=self.bucket, Key=key, **extra
+                        )
+                        upload_id = created["UploadId"]
+                    parts.append(await self._upload_part(key, upload_id, len(parts) + 1, bytes(buffer[:part_size])))
+                    del buffer[:part_size]
+            
+            if upload_id is None:
+                await asyncio.to_thread(
+                    self.client.put_object, Bucket=self.bucket, Key=key, Body=bytes(buffer), **extra
+                )
+                return key
+            
+            if buffer:
+                parts.append(await self._upload_part(key, upload_id, len(parts) + 1, bytes(buffer)))
+            await asyncio.to_thread(
+                self.client.complete_multipart_upload,
+                Bucket=self.bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={"Parts": parts}
+            )
+            return key
+        except BaseException:
+            if upload_id is not None:
+                # Don't leave billed, invisible parts behind
+                await asyncio.shield(asyncio.to_thread(
+                    self.client.abort_multipart_upload, Bucket=self.bucket, Key=key, UploadId=upload_id
+                ))
+            raise
+    
+    async def _upload_part(self, key: str, upload_id: str, number: int, body: bytes) -> dict:
+        response = await asyncio.to_thread(
+            self.client.upload_part,
+            Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body
+        )
+        return {"PartNumber": number, "ETag": response["ETag"]}
+    
+    async def delete(self, key: str):
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=key)
+    
+    def public_url(self, key: str) -> str:
+        """CDN URL when configured, otherwise the API route that redirects to a presigned URL"""
+        if settings.STORAGE_PUBLIC_URL:
+            return f"{settings.STORAGE_PUBLIC_URL.rstrip('/')}/{key}"
+        return f"{settings.API_V1_PREFIX}/media/{key}"
+    
+    def key_for_url(self, url: str) -> Optional[str]:
+        """The key behind a public_url, or None for URLs stored elsewhere (ValueError if it escapes the root)"""
+        prefixes = [f"{settings.API_V1_PREFIX}/media/"]
+        if settings.STORAGE_PUBLIC_URL:
+            prefixes.append(f"{settings.STORAGE_PUBLIC_URL.rstrip('/')}/")
+        for prefix in prefixes:
+            if url.startswith(prefix):
+                return _checked_key(url[len(prefix):])
+        return None
+    
+    def local_path(self, key: str) -> Optional[Path]:
+        """Objects have no local file; read them through signed_url"""
+        return None
+    
+    async def signed_url(self, key: str) -> str:
+        """Short-lived direct download URL"""
+        return await asyncio.to_thread(
+            self.client.generate_presigned_url,
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=settings.STORAGE_URL_EXPIRY
+        )
+
+
+_storage = None
+
+
+def get_storage():
+    """The configured storage backend, created on first use"""
+    global _storage
+    if _storage is None:
+        if settings.STORAGE_BACKEND == "s3":
+            _storage = S3Storage()
+        else:
+            _storage = LocalStorage(Path("static/generations"), "/static/generations")
+    return _storage
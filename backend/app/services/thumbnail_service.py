@@ -0,0 +1,127 @@
+import asyncio
+import tempfile
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import httpx
+
+from ..core.config import settings
+from ..core.http import create_http_client
+from .storage import get_storage, content_key
+
+IMAGE_TYPES = {"image", "banner", "logo", "background_removal"}
+VIDEO_TYPES = {"video", "presenter_video"}
+
+
+def _render_webp(source: Path, target: Path, size: int):
+    """Downscale an image to fit `size` x `size` and save it as WebP (keeps transparency)"""
+    from PIL import Image, ImageOps
+    
+    with Image.open(source) as image:
+        # JPEG sources are decoded straight at a reduced scale
+        image.draft("RGB", (size, size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        image.save(target, "WEBP", quality=settings.THUMBNAIL_QUALITY, method=4)
+
+
+class ThumbnailService:
+    """
+    Preview derivatives for history grids, rendered by the worker once a
+    generation completes: a small WebP thumbnail for every image and video,
+    plus a poster frame for videos. Files are content-addressed, so identical
+    outputs share one set of previews and are cached as immutable.
+    """
+    
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared HTTP client for fetching provider outputs, created on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = create_http_client(
+                base_url="",
+                timeout=60.0,
+                max_connections=20,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+            )
+        return self._client
+    
+    def supports(self, gen_type: str) -> bool:
+        return gen_type in IMAGE_TYPES or gen_type in VIDEO_TYPES
+    
+    async def create(self, gen_type: str, output_url: str) -> Tuple[str, Optional[str]]:
+        """
+        Render the previews for a generation's output.
+        Returns: (thumbnail URL, poster URL - None for images).
+        """
+        source = await self._source(output_url)
+        
+        with tempfile.TemporaryDirectory() as work_dir:
+            work = Path(work_dir)
+            poster_url = None
+            
+            if gen_type in VIDEO_TYPES:
+                # ffmpeg seeks remote videos with range requests: only the
+                # bytes around the frame are fetched, not the whole file
+                frame = work / "frame.png"
+                await self._grab_frame(source, frame)
+                poster = work / "poster.webp"
+                await asyncio.to_thread(_render_webp, frame, poster, settings.POSTER_SIZE)
+                poster_url = await self._store("posters", poster)
+            elif isinstance(source, Path):
+                frame = source
+            else:
+                frame = await self._download(source, work / "source")
+            
+            thumbnail = work / "thumbnail.webp"
+            await asyncio.to_thread(_render_webp, frame, thumbnail, settings.THUMBNAIL_SIZE)
+            return await self._store("thumbs", thumbnail), poster_url
+    
+    async def _source(self, url: str) -> Union[Path, str]:
+        """Local file for media we store on disk, otherwise a URL to fetch"""
+        storage = get_storage()
+        key = storage.key_for_url(url)
+        if key is None:
+            # Provider output URL
+            return url
+        return storage.local_path(key) or await storage.signed_url(key)
+    
+    async def _download(self, url: str, target: Path) -> Path:
+        async with self.client.stream("GET", url) as response:
+            if response.status_code != 200:
+                raise Exception(f"Could not fetch {url}: HTTP {response.status_code}")
+            with open(target, "wb") as f:
+                async for chunk in response.aiter_bytes(1024 * 1024):
+                    await asyncio.to_thread(f.write, chunk)
+        return target
+    
+    async def _grab_frame(self, source: Union[Path, str], target: Path):
+        """Save the frame at 1s (the first one for shorter clips) as a PNG"""
+        for offset in ("1", "0"):
+            proc = await asyncio.create_subprocess_exec(
+                "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+                "-ss", offset, "-i", str(source), "-frames:v", "1", str(target),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            _, stderr = await proc.communicate()
+            if proc.returncode != 0:
+                raise Exception(f"ffmpeg failed: {stderr.decode()}")
+            if target.exists():
+                return
+        raise Exception("Video has no frames")
+    
+    async def _store(self, prefix: str, path: Path) -> str:
+        storage = get_storage()
+        key = await content_key(prefix, path)
+        if not await storage.exists(key):
+            await storage.save_file(key, path, "image/webp")
+        return storage.public_url(key)
+
+
+# Singleton instance
+thumbnail_service = ThumbnailService()
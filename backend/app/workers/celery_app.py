@@ -4,7 +4,8 @@ from app.core.config import settings
 celery_app = Celery(
     "worker",
     broker=settings.REDIS_URL,
-    backend=settings.REDIS_URL
+    backend=settings.REDIS_URL,
+    include=["app.workers.tasks"]
 )
 
 celery_app.conf.update(
@@ -13,4 +14,7 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    # Generations are long-running; take one job at a time per process
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
 )
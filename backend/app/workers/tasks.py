@@ -0,0 +1,86 @@
+import asyncio
+import uuid
+
+from app.core.database import async_session
+from app.models.user import Generation
+from app.services import events
+from app.services.generation_service import execute_generation, complete_generation, fail_generation
+from app.services.thumbnail_service import thumbnail_service
+from .celery_app import celery_app
+
+# One event loop per worker process, so the async DB engine and HTTP
+# clients keep their pooled connections between tasks.
+_loop = None
+
+
+def run_async(coro):
+    """Run a coroutine on the worker's persistent event loop"""
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop.run_until_complete(coro)
+
+
+@celery_app.task(name="generations.process")
+def process_generation(generation_id: str):
+    """Run a queued generation and write back its result"""
+    run_async(_process_generation(uuid.UUID(generation_id)))
+
+
+async def _process_generation(generation_id: uuid.UUID):
+    async with async_session() as db:
+        gen = await db.get(Generation, generation_id)
+        
+        # Skip unknown or finished jobs. A job found "processing" was started by
+        # a worker that died before acking (task_acks_late), so run it again;
+        # an identical call still running elsewhere is joined by single-flight.
+        if not gen or gen.status not in ("pending", "processing"):
+            return
+        
+        gen.status = "processing"
+        await db.commit()
+        await events.publish(gen)
+        
+        try:
+            output_url = await execute_generation(gen)
+        except Exception as e:
+            if await _still_processing(db, gen):
+                # Refund credits on failure
+                await fail_generation(db, gen, str(e))
+            return
+        
+        if await _still_processing(db, gen):
+            await complete_generation(db, gen, output_url)
+
+
+async def _still_processing(db, gen: Generation) -> bool:
+    """False when another delivery of the same job has already finished it"""
+    await db.refresh(gen, ["status"])
+    return gen.status == "processing"
+
+
+@celery_app.task(name="generations.thumbnails")
+def create_thumbnails(generation_id: str):
+    """Render the WebP thumbnail (and video poster) of a completed generation"""
+    run_async(_create_thumbnails(uuid.UUID(generation_id)))
+
+
+async def _create_thumbnails(generation_id: uuid.UUID):
+    async with async_session() as db:
+        gen = await db.get(Generation, generation_id)
+        if not gen or gen.status != "completed" or not gen.output_url or gen.thumbnail_url:
+            return
+        gen_type, output_url = gen.type, gen.output_url
+    
+    # No connection is held while media is fetched and rendered
+    thumbnail_url, poster_url = await thumbnail_service.create(gen_type, output_url)
+    
+    async with async_session() as db:
+        gen = await db.get(Generation, generation_id)
+        if not gen:
+            return
+        gen.thumbnail_url = thumbnail_url
+        gen.poster_url = poster_url
+        await db.commit()
+        await events.publish(gen)
@@ -0,0 +1 @@
+# Local inference engines (importable in-process by LocalAIService)
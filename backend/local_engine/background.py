@@ -0,0 +1,68 @@
+import argparse
+import os
+import sys
+import threading
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Optional at import time so the API can load this module in-process;
+# callers get a clear error when rembg is missing
+try:
+    from rembg import new_session, remove
+except ImportError:
+    new_session = remove = None
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_session(model_name="u2net"):
+    """
+    Load the ONNX segmentation model once per process and keep it resident,
+    so each image pays inference time only.
+    """
+    if new_session is None:
+        raise RuntimeError("rembg not installed. Please install with: pip install rembg onnxruntime")
+    
+    with _sessions_lock:
+        if model_name not in _sessions:
+            print(f"Loading background removal model: {model_name}")
+            _sessions[model_name] = new_session(model_name)
+        return _sessions[model_name]
+
+def remove_backgrounds(images, model_name="u2net"):
+    """
+    Cut out the background of a batch of encoded images (PNG/JPEG/WebP bytes)
+    with the shared session. Returns one entry per image, in order: PNG bytes
+    with transparency, or the exception that image raised, so one bad input
+    does not fail the rest of the batch.
+    """
+    session = get_session(model_name)
+    results = []
+    for image in images:
+        try:
+            results.append(remove(image, session=session))
+        except Exception as e:
+            results.append(e)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove image backgrounds on the CPU (rembg)")
+    parser.add_argument("inputs", nargs="+", help="Input images")
+    parser.add_argument("--output_dir", default=".", help="Where to write <name>.png cut-outs")
+    parser.add_argument("--model", default="u2net", help="rembg model (u2net, u2netp, isnet-general-use, ...)")
+    args = parser.parse_args()
+    
+    images = []
+    for path in args.inputs:
+        with open(path, "rb") as f:
+            images.append(f.read())
+    
+    for path, result in zip(args.inputs, remove_backgrounds(images, args.model)):
+        if isinstance(result, Exception):
+            print(f"Failed: {path}: {result}")
+            continue
+        output_path = os.path.join(args.output_dir, os.path.splitext(os.path.basename(path))[0] + ".png")
+        with open(output_path, "wb") as f:
+            f.write(result)
+        print(f"Success! Saved to {output_path}")
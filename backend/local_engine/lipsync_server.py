@@ -0,0 +1,367 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Persistent Wav2Lip server.
+# Loads the checkpoint and face detector once, then takes jobs over a local
+# TCP socket (one JSON line per request). Frames from all active jobs are
+# interleaved into shared batches, so concurrent jobs share forward passes.
+#
+# Protocol:
+#   -> {"face": "/abs/avatar.jpg", "audio": "/abs/voice.wav", "outfile": "/abs/out.mp4"}
+#   <- {"progress": 0.42}            (zero or more)
+#   <- {"ok": true, "outfile": "..."} | {"ok": false, "error": "..."}
+# Closing the connection cancels the job.
+
+WAV2LIP_PATH = Path(os.path.dirname(os.path.abspath(__file__))) / "Wav2Lip"
+sys.path.append(str(WAV2LIP_PATH))
+
+MEL_STEP_SIZE = 16
+IMG_SIZE = 96
+FPS = 25
+PADS = (0, 10, 0, 0)  # top, bottom, left, right (Wav2Lip defaults)
+
+
+class LipSyncJob:
+    """A single request: cropped face plus mel chunks, rendered in order"""
+
+    def __init__(self, face_path, audio_path, outfile, frame, face, coords, mels):
+        self.face_path = face_path
+        self.audio_path = audio_path
+        self.outfile = outfile
+        self.frame = frame
+        self.face = face
+        self.coords = coords
+        self.mels = mels
+        self.next_index = 0
+        self.written = 0
+        self.writer = None
+        self.temp_video = None
+        self.cancelled = False
+        self.finish_task = None
+        self.progress = asyncio.Queue()
+        self.done = asyncio.get_running_loop().create_future()
+
+    @property
+    def remaining(self) -> int:
+        return len(self.mels) - self.next_index
+
+
+class LipSyncEngine:
+    """Owns the warm model and the cross-job batching loop"""
+
+    def __init__(self, checkpoint_path: str, batch_size: int = 128, batch_wait_ms: int = 20, face_cache_size: int = 32):
+        import torch
+        import face_detection
+        from models import Wav2Lip
+
+        self.torch = torch
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+
+        print(f"Loading Wav2Lip checkpoint {checkpoint_path} on {self.device}...")
+        model = Wav2Lip()
+        checkpoint = torch.load(checkpoint_path, map_location=self.device)
+        state = {k.replace("module.", ""): v for k, v in checkpoint["state_dict"].items()}
+        model.load_state_dict(state)
+        self.model = model.to(self.device).eval()
+
+        self.detector = face_detection.FaceAlignment(
+            face_detection.LandmarksType._2D, flip_input=False, device=self.device
+        )
+
+        # Avatars are reused constantly; detect each face once (LRU, since
+        # every entry holds the full source frame)
+        self._face_cache = OrderedDict()
+        self._face_cache_size = face_cache_size
+
+        # GPU work is serialized on one thread; I/O gets its own pool
+        self._model_thread = ThreadPoolExecutor(max_workers=1)
+        self._io_pool = ThreadPoolExecutor(max_workers=4)
+
+        self._jobs = []
+        # Jobs with frames in the batch being rendered
+        self._busy = set()
+        self._wakeup = asyncio.Event()
+        print("Wav2Lip ready.")
+
+    # ---------- Job preparation ----------
+
+    def _detect_face(self, face_path: str):
+        import cv2
+
+        key = (face_path, os.path.getmtime(face_path))
+        if key in self._face_cache:
+            self._face_cache.move_to_end(key)
+        else:
+            frame = cv2.imread(face_path)
+            if frame is None:
+                raise ValueError(f"Could not read face image: {face_path}")
+            rect = self.detector.get_detections_for_batch(frame[None, ...])[0]
+            if rect is None:
+                raise ValueError("Face not detected!")
+
+            pady1, pady2, padx1, padx2 = PADS
+            y1 = max(0, rect[1] - pady1)
+            y2 = min(frame.shape[0], rect[3] + pady2)
+            x1 = max(0, rect[0] - padx1)
+            x2 = min(frame.shape[1], rect[2] + padx2)
+
+            face = cv2.resize(frame[y1:y2, x1:x2], (IMG_SIZE, IMG_SIZE))
+            self._face_cache[key] = (frame, face, (y1, y2, x1, x2))
+            if len(self._face_cache) > self._face_cache_size:
+                self._face_cache.popitem(last=False)
+        return self._face_cache[key]
+
+    def _mel_chunks(self, audio_path: str) -> list:
+        import audio
+
+        wav = audio.load_wav(audio_path, 16000)
+        mel = audio.melspectrogram(wav)
+
+        chunks = []
+        mel_idx_multiplier = 80.0 / FPS
+        i = 0
+        while True:
+            start_idx = int(i * mel_idx_multiplier)
+            if start_idx + MEL_STEP_SIZE > len(mel[0]):
+                chunks.append(mel[:, len(mel[0]) - MEL_STEP_SIZE:])
+                break
+            chunks.append(mel[:, start_idx:start_idx + MEL_STEP_SIZE])
+            i += 1
+        return chunks
+
+    async def submit(self, face_path: str, audio_path: str, outfile: str) -> LipSyncJob:
+        loop = asyncio.get_running_loop()
+        # Face detection shares the device with the model, so it runs on
+        # the model thread; audio features are prepared on the I/O pool
+        frame, face, coords = await loop.run_in_executor(self._model_thread, self._detect_face, face_path)
+        mels = await loop.run_in_executor(self._io_pool, self._mel_chunks, audio_path)
+        job = LipSyncJob(face_path, audio_path, outfile, frame, face, coords, mels)
+
+        self._jobs.append(job)
+        self._wakeup.set()
+        return job
+
+    def cancel(self, job: LipSyncJob):
+        """Drop a job whose client went away: render no more frames and discard its output"""
+        job.cancelled = True
+        if job in self._jobs:
+            self._jobs.remove(job)
+        if job.finish_task is not None:
+            # _finish stops ffmpeg and removes the temp video
+            job.finish_task.cancel()
+        elif job not in self._busy:
+            # Otherwise the batching loop discards it once the batch is written
+            self._discard(job)
+        if not job.done.done():
+            job.done.cancel()
+
+    def _discard(self, job: LipSyncJob):
+        if job.writer is not None:
+            job.writer.release()
+            job.writer = None
+        if job.temp_video and os.path.exists(job.temp_video):
+            os.remove(job.temp_video)
+
+    # ---------- Batching loop ----------
+
+    def _take_batch(self) -> list:
+        """Round-robin frames across active jobs so no job starves"""
+        batch = []
+        while len(batch) < self.batch_size:
+            active = [job for job in self._jobs if job.remaining > 0]
+            if not active:
+                break
+            share = max(1, (self.batch_size - len(batch)) // len(active))
+            for job in active:
+                take = min(share, job.remaining, self.batch_size - len(batch))
+                for _ in range(take):
+                    batch.append((job, job.next_index))
+                    job.next_index += 1
+                if len(batch) >= self.batch_size:
+                    break
+        return batch
+
+    def _forward(self, batch: list):
+        import numpy as np
+
+        faces = np.asarray([job.face for job, _ in batch])
+        mels = np.asarray([job.mels[i] for job, i in batch])
+
+        masked = faces.copy()
+        masked[:, IMG_SIZE // 2:] = 0
+        img_batch = np.concatenate((masked, faces), axis=3) / 255.0
+        mel_batch = np.reshape(mels, [len(mels), mels.shape[1], mels.shape[2], 1])
+
+        img_tensor = self.torch.FloatTensor(np.transpose(img_batch, (0, 3, 1, 2))).to(self.device)
+        mel_tensor = self.torch.FloatTensor(np.transpose(mel_batch, (0, 3, 1, 2))).to(self.device)
+
+        with self.torch.no_grad():
+            pred = self.model(mel_tensor, img_tensor)
+        return pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.0
+
+    def _write_frames(self, batch: list, preds):
+        import cv2
+        import numpy as np
+
+        for (job, _), pred in zip(batch, preds):
+            if job.cancelled:
+                continue
+            if job.writer is None:
+                handle, job.temp_video = tempfile.mkstemp(suffix=".avi")
+                os.close(handle)
+                frame_h, frame_w = job.frame.shape[:-1]
+                job.writer = cv2.VideoWriter(
+                    job.temp_video, cv2.VideoWriter_fourcc(*"DIVX"), FPS, (frame_w, frame_h)
+                )
+            y1, y2, x1, x2 = job.coords
+            frame = job.frame.copy()
+            frame[y1:y2, x1:x2] = cv2.resize(pred.astype(np.uint8), (x2 - x1, y2 - y1))
+            job.writer.write(frame)
+            job.written += 1
+
+    async def _finish(self, job: LipSyncJob):
+        """Mux the rendered frames with the source audio"""
+        try:
+            job.writer.release()
+            job.writer = None
+            proc = await asyncio.create_subprocess_exec(
+                "ffmpeg", "-y", "-loglevel", "error",
+                "-i", job.audio_path, "-i", job.temp_video,
+                "-strict", "-2", "-q:v", "1", job.outfile,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                _, stderr = await proc.communicate()
+            except asyncio.CancelledError:
+                proc.kill()
+                await proc.wait()
+                raise
+            if proc.returncode != 0:
+                raise RuntimeError(f"ffmpeg failed: {stderr.decode()}")
+            job.done.set_result(job.outfile)
+        except Exception as e:
+            if not job.done.done():
+                job.done.set_exception(e)
+        finally:
+            if job.temp_video and os.path.exists(job.temp_video):
+                os.remove(job.temp_video)
+
+    def _fail_all(self, batch: list, error: Exception):
+        for job in {job for job, _ in batch}:
+            if job in self._jobs:
+                self._jobs.remove(job)
+            self._discard(job)
+            if not job.done.done():
+                job.done.set_exception(error)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not any(job.remaining > 0 for job in self._jobs):
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            # Give concurrently arriving jobs a moment to join this batch
+            await asyncio.sleep(self.batch_wait)
+            batch = self._take_batch()
+            if not batch:
+                continue
+
+            self._busy = {job for job, _ in batch}
+            try:
+                preds = await loop.run_in_executor(self._model_thread, self._forward, batch)
+                await loop.run_in_executor(self._io_pool, self._write_frames, batch, preds)
+            except Exception as e:
+                self._fail_all(batch, e)
+                continue
+            finally:
+                jobs, self._busy = self._busy, set()
+
+            for job in jobs:
+                if job.cancelled:
+                    self._discard(job)
+                    continue
+                job.progress.put_nowait(job.written / len(job.mels))
+                if job.written == len(job.mels):
+                    self._jobs.remove(job)
+                    job.finish_task = asyncio.create_task(self._finish(job))
+
+
+async def handle_client(engine: LipSyncEngine, reader, writer):
+    async def send(message: dict):
+        writer.write((json.dumps(message) + "\n").encode())
+        await writer.drain()
+
+    job = None
+    disconnected = None
+    try:
+        line = await reader.readline()
+        request = json.loads(line)
+        job = await engine.submit(request["face"], request["audio"], request["outfile"])
+
+        # Clients send nothing after the request, so this read only
+        # completes when the connection is closed
+        disconnected = asyncio.ensure_future(reader.read(1))
+        while not job.done.done():
+            progress_task = asyncio.ensure_future(job.progress.get())
+            await asyncio.wait({progress_task, job.done, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                progress_task.cancel()
+                raise ConnectionError("Client disconnected")
+            if progress_task.done():
+                await send({"progress": round(progress_task.result(), 3)})
+            else:
+                progress_task.cancel()
+
+        await send({"ok": True, "outfile": job.done.result()})
+    except Exception as e:
+        if not writer.is_closing():
+            try:
+                await send({"ok": False, "error": str(e)})
+            except (ConnectionError, OSError):
+                pass
+    finally:
+        if job is not None and not job.done.done():
+            engine.cancel(job)
+        if disconnected is not None:
+            disconnected.cancel()
+        writer.close()
+
+
+async def serve(args):
+    engine = LipSyncEngine(args.checkpoint_path, args.batch_size, args.batch_wait_ms, args.face_cache_size)
+    server = await asyncio.start_server(
+        lambda r, w: handle_client(engine, r, w), args.host, args.port
+    )
+    print(f"LipSync server listening on {args.host}:{args.port}")
+    async with server:
+        await asyncio.gather(server.serve_forever(), engine.run())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Persistent LipSync Server (Wav2Lip)")
+    parser.add_argument("--checkpoint_path", type=str, required=True, help="Path to .pth model")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch_size", type=int, default=128, help="Frames per forward pass")
+    parser.add_argument("--batch_wait_ms", type=int, default=20, help="Time to gather frames from concurrent jobs")
+    parser.add_argument("--face_cache_size", type=int, default=32, help="Avatars whose detected face is kept in memory")
+
+    args = parser.parse_args()
+
+    if not WAV2LIP_PATH.exists():
+        print(f"Error: Wav2Lip not found at {WAV2LIP_PATH}")
+        print("Please clone the repo: git clone https://github.com/Rudrabha/Wav2Lip")
+        sys.exit(1)
+
+    asyncio.run(serve(args))
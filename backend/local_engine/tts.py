@@ -6,18 +6,17 @@ import sys
 # Add current directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# Optional at import time so the API can load this module in-process;
+# callers get a clear error when edge-tts is missing
 try:
     import edge_tts
 except ImportError:
-    print("Error: edge-tts not installed. Please install with: pip install edge-tts")
-    sys.exit(1)
+    edge_tts = None
 
-async def generate_voice_async(text, voice_id, output_path):
-    """
-    Generate speech from text using Microsoft Edge TTS (High Quality, Free).
-    """
-    print(f"Generating Audio via Edge TTS...")
-    print(f"Text: {text[:30]}...")
+def _communicate(text, voice_id, speed):
+    """Build the Edge TTS request for a voice and speed"""
+    if edge_tts is None:
+        raise RuntimeError("edge-tts not installed. Please install with: pip install edge-tts")
     
     # Map friendly names to Edge TTS voices (High Quality Neural Voices)
     VOICE_MAP = {
@@ -36,21 +35,47 @@ async def generate_voice_async(text, voice_id, output_path):
     selected_voice = VOICE_MAP.get(voice_id, VOICE_MAP["default"])
     print(f"Using Voice: {selected_voice}")
 
-    communicate = edge_tts.Communicate(text, selected_voice)
+    # Edge TTS takes speed as a relative rate, e.g. 1.25 -> "+25%"
+    rate = f"{round((speed - 1.0) * 100):+d}%"
+
+    return edge_tts.Communicate(text, selected_voice, rate=rate)
+
+async def generate_voice_async(text, voice_id, output_path, speed=1.0):
+    """
+    Generate speech from text using Microsoft Edge TTS (High Quality, Free).
+    """
+    print(f"Generating Audio via Edge TTS...")
+    print(f"Text: {text[:30]}...")
+    
+    communicate = _communicate(text, voice_id, speed)
     await communicate.save(output_path)
     
     print(f"Success! Audio saved to {output_path}")
 
-def generate_voice(text, voice_id, output_path):
+async def stream_voice_async(text, voice_id, speed=1.0):
+    """
+    Same as generate_voice_async, but yields MP3 chunks as Edge TTS produces them.
+    """
+    communicate = _communicate(text, voice_id, speed)
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            yield chunk["data"]
+
+def generate_voice(text, voice_id, output_path, speed=1.0):
     """Wrapper to run async function from sync context"""
-    asyncio.run(generate_voice_async(text, voice_id, output_path))
+    asyncio.run(generate_voice_async(text, voice_id, output_path, speed))
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Local TTS Engine (Edge-TTS)")
     parser.add_argument("--text", type=str, required=True, help="Text to speak")
     parser.add_argument("--voice", type=str, default="default", help="Voice ID")
     parser.add_argument("--output", type=str, required=True, help="Output wav/mp3 file path")
+    parser.add_argument("--speed", type=float, default=1.0, help="Speech speed (1.0 = normal)")
     
     args = parser.parse_args()
     
-    generate_voice(args.text, args.voice, args.output)
+    if edge_tts is None:
+        print("Error: edge-tts not installed. Please install with: pip install edge-tts")
+        sys.exit(1)
+    
+    generate_voice(args.text, args.voice, args.output, args.speed)
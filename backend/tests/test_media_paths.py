@@ -0,0 +1,57 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.core.database import get_db
+from app.core.security import get_current_user
+from app.models.user import User
+from app.services.storage import LocalStorage
+
+TRAVERSAL_URLS = [
+    "/static/generations/../../app/core/config.py",
+    "/static/generations/images/../../../etc/passwd",
+    "/static/generations//etc/passwd",
+]
+
+
+@pytest.fixture
+def client():
+    async def no_db():
+        yield None
+    
+    app.dependency_overrides[get_current_user] = lambda: User(id=uuid.uuid4(), email="a@b.com", credits=100)
+    app.dependency_overrides[get_db] = no_db
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.parametrize("url", TRAVERSAL_URLS)
+def test_remove_background_rejects_traversal(client, url):
+    response = client.post("/api/v1/images/remove-background", json={"image_url": url})
+    assert response.status_code == 400
+
+
+def test_remove_background_batch_rejects_traversal(client):
+    response = client.post(
+        "/api/v1/images/remove-background-batch",
+        json={"image_urls": ["/static/generations/images/ok.png", TRAVERSAL_URLS[0]]}
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("url", TRAVERSAL_URLS)
+def test_local_storage_rejects_traversal(tmp_path, url):
+    storage = LocalStorage(tmp_path, "/static/generations")
+    with pytest.raises(ValueError):
+        storage.key_for_url(url)
+    with pytest.raises(ValueError):
+        storage.path_for("../outside.txt")
+
+
+def test_local_storage_keeps_valid_keys(tmp_path):
+    storage = LocalStorage(tmp_path, "/static/generations")
+    assert storage.key_for_url("/static/generations/images/abc.png") == "images/abc.png"
+    assert storage.path_for("images/abc.png") == (tmp_path / "images/abc.png").resolve()
+    assert storage.key_for_url("https://example.com/a.png") is None
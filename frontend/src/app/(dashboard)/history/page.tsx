@@ -20,6 +20,8 @@ interface Generation {
     status: string;
     prompt?: string;
     output_url?: string;
+    thumbnail_url?: string;
+    poster_url?: string;
     credits_used: number;
     created_at: string;
 }
@@ -140,12 +142,15 @@ export default function HistoryPage() {
                                         ) : gen.type.includes("video") ? (
                                             <video
                                                 src={gen.output_url}
+                                                poster={gen.poster_url || gen.thumbnail_url}
+                                                preload={gen.poster_url || gen.thumbnail_url ? "none" : "metadata"}
                                                 className="w-full h-full object-cover"
                                             />
                                         ) : (
                                             <img
-                                                src={gen.output_url}
+                                                src={gen.thumbnail_url || gen.output_url}
                                                 alt={gen.prompt || "Generated"}
+                                                loading="lazy"
                                                 className="w-full h-full object-cover"
                                             />
                                         )
@@ -7,6 +7,7 @@ interface Generation {
     prompt?: string;
     output_url?: string;
     thumbnail_url?: string;
+    poster_url?: string;
     credits_used: number;
     created_at: string;
     completed_at?: string;